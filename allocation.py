@@ -0,0 +1,164 @@
+"""
+Penjadwal alokasi pre-order berbasis event.
+
+Pengganti loop polling 10 detik: alokasi hanya jalan kalau ada event
+`restock` (addstock, item dikembalikan dari reservasi/alokasi yang batal)
+atau `preorder_placed` untuk kode tersebut.
+
+    bot.dispatch("restock", kode)
+
+Request untuk kode yang sedang dialokasikan digabung (coalesce) jadi satu
+putaran ulang setelah putaran berjalan selesai, jadi satu kode tidak pernah
+dialokasikan paralel dan burst restock tidak menumpuk task.
+
+`allocate_batch` mengisi seluruh antrian PO satu kode dalam SATU job writer
+(satu commit); notifikasi DM dikirim setelahnya lewat `fan_out` (paralel,
+dibatasi semaphore). PO yang DM-nya gagal dibatalkan lewat `cancel_fill`
+(item balik ke stock, saldo direfund).
+"""
+import asyncio
+import os
+
+from reservations import claim_items, restore_items
+
+# Maks DM paralel. Rate limit per route (bucket + retry 429) sudah ditangani
+# HTTP client discord.py; semaphore ini menjaga burst tetap jauh di bawah
+# global limit (50 req/detik) walau antrian PO ratusan.
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", "8"))
+
+
+class AllocationScheduler:
+    def __init__(self, allocate):
+        self._allocate = allocate  # async fn(kode)
+        self._running = {}  # kode -> task
+        self._dirty = set()  # kode yang dapat request baru saat sedang jalan
+
+    def request(self, kode: str):
+        if kode in self._running:
+            self._dirty.add(kode)
+            return
+        self._running[kode] = asyncio.create_task(self._run(kode))
+
+    async def _run(self, kode: str):
+        try:
+            while True:
+                self._dirty.discard(kode)
+                try:
+                    await self._allocate(kode)
+                except Exception as e:
+                    print(f"[AUTO_ALLOCATE] Alokasi {kode} gagal: {e}")
+                if kode not in self._dirty:
+                    break
+        finally:
+            self._running.pop(kode, None)
+
+    def is_running(self, kode: str) -> bool:
+        return kode in self._running
+
+
+async def fan_out(jobs, deliver, limit: int = DM_CONCURRENCY) -> list:
+    """
+    Jalankan `await deliver(job)` untuk semua job, maksimal `limit` sekaligus.
+    Return list exception sejajar dengan `jobs` (None = sukses), jadi caller
+    tahu delivery mana yang gagal (mis. untuk refund).
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def one(job):
+        async with sem:
+            try:
+                await deliver(job)
+            except Exception as e:
+                return e
+            return None
+
+    return await asyncio.gather(*(one(job) for job in jobs))
+
+
+# ===== Batch allocator (job writer, panggil lewat db.run) =====
+def allocate_batch(cur, kode):
+    """
+    Isi antrian PO `kode` (FIFO) sekaligus: klaim item sekali, bagi jatah di
+    memori, tulis transactions/preorder_items/status dalam satu transaksi.
+    Return (price, fills); fills = list dict per PO yang mendapat item.
+    """
+    row = cur.execute("SELECT harga, available_qty FROM stock WHERE kode=?", (kode,)).fetchone()
+    if not row or int(row[1] or 0) <= 0:
+        return 0, []
+    price, available = int(row[0] or 0), int(row[1])
+
+    queue = cur.execute(
+        """
+        SELECT id, user_id, nama, amount
+        FROM preorders
+        WHERE kode=? AND status='waiting'
+        ORDER BY created_at ASC, id ASC
+    """,
+        (kode,),
+    ).fetchall()
+    need = min(available, sum(max(int(amount or 0), 0) for *_, amount in queue))
+    if need <= 0:
+        return price, []
+
+    items = claim_items(cur, kode, need)
+    fills = []
+    pos = 0
+    for po_id, user_id, growid, amount in queue:
+        amount = int(amount or 0)
+        if pos >= len(items):
+            break
+        if amount <= 0:
+            continue
+        # Jatah user = min(amount, sisa item)
+        jatah = min(amount, len(items) - pos)
+        share = items[pos:pos + jatah]
+        pos += jatah
+
+        cur.execute(
+            "INSERT INTO transactions (user_id, kode, jumlah, harga) VALUES (?, ?, ?, ?)",
+            (user_id, kode, jatah, price),
+        )
+        fills.append({
+            "po_id": po_id,
+            "user_id": user_id,
+            "growid": growid,
+            "amount": amount,
+            "jatah": jatah,
+            "items": share,
+            "transaction_id": cur.lastrowid,
+        })
+
+    cur.executemany(
+        "INSERT INTO preorder_items (preorder_id, nama_barang) VALUES (?, ?)",
+        [(f["po_id"], nama_barang) for f in fills for _, nama_barang in f["items"]],
+    )
+    # terpenuhi semua -> success; partial -> sisa tetap waiting (kurangi amount)
+    cur.executemany(
+        "UPDATE preorders SET status='success' WHERE id=?",
+        [(f["po_id"],) for f in fills if f["jatah"] == f["amount"]],
+    )
+    cur.executemany(
+        "UPDATE preorders SET amount=? WHERE id=?",
+        [(f["amount"] - f["jatah"], f["po_id"]) for f in fills if f["jatah"] < f["amount"]],
+    )
+    return price, fills
+
+
+def cancel_fill(cur, kode, price, fill):
+    """
+    DM gagal: kembalikan item, hapus transaksi, cancel PO & refund sisa PO
+    (amount * harga SAAT INI, sama seperti sebelumnya). Return refund_total.
+    """
+    items = fill["items"]
+    restore_items(cur, kode, items)
+    cur.execute(
+        f"DELETE FROM preorder_items WHERE preorder_id=? AND nama_barang IN ({','.join(['?'] * len(items))})",
+        [fill["po_id"]] + [nama_barang for _, nama_barang in items],
+    )
+    cur.execute("DELETE FROM transactions WHERE id=?", (fill["transaction_id"],))
+    refund_total = fill["amount"] * price
+    cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (refund_total, fill["user_id"]))
+    cur.execute(
+        "UPDATE preorders SET status='cancelled', amount=? WHERE id=?", (fill["amount"], fill["po_id"])
+    )
+    return refund_total
@@ -4,7 +4,6 @@ Run this file: python bot_core.py
 """
 import discord
 from discord.ext import commands, tasks
-import sqlite3
 import re
 from dotenv import load_dotenv
 import os
@@ -13,6 +12,13 @@ import pkgutil
 import io
 # from command import cmd_ltoken
 import asyncio # WAJIB: Import asyncio untuk create_task()
+from database import DB_PATH, Database
+from migrations import check_indexes, migrate
+from allocation import AllocationScheduler, allocate_batch, cancel_fill, fan_out
+from outbox import PRIORITY_HIGH, PRIORITY_NORMAL, Outbox, enqueue
+from user_resolver import UserResolver
+from maintenance import MaintenanceState
+from rest_scheduler import LANE_CRITICAL, rest
 
 load_dotenv()
 
@@ -27,115 +33,15 @@ intents = discord.Intents.all()
 bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
 # ===== Database =====
-DB_NAME = "discord_sqlite_bot.db"
-conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-c = conn.cursor()
-
-# Schema (idempotent)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS users (
-    nama TEXT PRIMARY KEY,
-    balance INTEGER DEFAULT 0
-)"""
-)
-
-try:
-    c.execute("ALTER TABLE users ADD COLUMN poin INTEGER DEFAULT 0")
-except sqlite3.OperationalError:
-    pass
-
-try:
-    c.execute("ALTER TABLE users ADD COLUMN user_id INTEGER")
-except sqlite3.OperationalError:
-    pass
-
-c.execute(
-    """CREATE TABLE IF NOT EXISTS maintenance (
-    is_mt INTEGER DEFAULT 0
-)"""
-)
-c.execute("INSERT OR IGNORE INTO maintenance (rowid, is_mt) VALUES (1, 0)")
-c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id)")
-conn.commit()
-
-# --- TAMBAHAN WAJIB untuk LToken dan Preorder (DITAMBAHKAN KEMBALI) ---
-c.execute(
-    """CREATE TABLE IF NOT EXISTS orders (
-    order_id TEXT PRIMARY KEY,
-    user_id INTEGER,
-    product_name TEXT,
-    qty INTEGER,
-    total INTEGER,
-    status TEXT,
-    created_at TEXT
-)"""
-)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS pending_orders (
-    order_id TEXT PRIMARY KEY, 
-    user_id INTEGER,
-    product_name TEXT,
-    qty INTEGER,
-    total INTEGER,
-    balance_before INTEGER,
-    status TEXT DEFAULT 'PENDING'
-)"""
-)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS deposit (
-    world TEXT,
-    bot TEXT
-)"""
-)
-c.execute( 
-    """CREATE TABLE IF NOT EXISTS preorders (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    nama TEXT,
-    kode TEXT,
-    amount INTEGER,
-    status TEXT DEFAULT 'waiting',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)"""
-)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS preorder_items (
-    preorder_id INTEGER,
-    nama_barang TEXT
-)"""
-)
-# --- AKHIR TAMBAHAN WAJIB ---
-
-
-c.execute(
-    """CREATE TABLE IF NOT EXISTS stock (
-    kode TEXT PRIMARY KEY,
-    judul TEXT,
-    harga INTEGER DEFAULT 0
-)"""
-)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS stock_items (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    kode TEXT,
-    nama_barang TEXT
-)"""
-)
-c.execute(
-    """CREATE TABLE IF NOT EXISTS transactions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    kode TEXT,
-    jumlah INTEGER,
-    waktu TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)"""
-)
-try:
-    c.execute("ALTER TABLE transactions ADD COLUMN harga INTEGER")
-except sqlite3.OperationalError:
-    pass
-c.execute("UPDATE transactions SET harga = 10 WHERE harga IS NULL")
-conn.commit()
+DB_NAME = DB_PATH
+db = Database(DB_NAME)
+bot.db = db  # gateway bersama untuk cog & utils
+migrate(db)  # schema_version: hanya step yang belum jalan
+check_indexes(db)
+bot.maintenance = MaintenanceState(bot, db)  # is_mt di memori, diubah lewat !mt
+bot.user_resolver = UserResolver(bot)  # get_user -> cache LRU/TTL -> fetch_user
+bot.outbox = Outbox(bot, db)  # antrian DM/testimoni/pengumuman (dikirim worker)
+
 
 def fmt_wl(x: int) -> str:
     """Format integer values with thousands separators using dots."""
@@ -151,12 +57,12 @@ for _, module_name, _ in pkgutil.iter_modules([commands_dir]):
     if hasattr(mod, "setup"):
         setup_func = mod.setup
         try:
-            # coba setup gaya lama (pakai DB, fmt_wl, dll) - 5 argumen
-            setup_func(bot, c, conn, fmt_wl, PREFIX)
+            # coba setup gaya lama (pakai DB gateway, fmt_wl, dll) - 4 argumen
+            setup_func(bot, db, fmt_wl, PREFIX)
         except TypeError:
             try:
-                # coba setup gaya 6 argumen (untuk cmd_status dll)
-                setup_func(bot, c, conn, fmt_wl, PREFIX, DB_NAME)
+                # coba setup gaya 5 argumen (untuk cmd_status dll)
+                setup_func(bot, db, fmt_wl, PREFIX, DB_NAME)
             except TypeError:
                 # fallback untuk setup gaya baru (async def setup(bot))
                 if asyncio.iscoroutinefunction(setup_func):
@@ -179,138 +85,116 @@ WEBHOOK_AUTHOR_ID = int(os.getenv("WEBHOOK_AUTHOR_ID", "0"))  # Webhook author I
 # ============================================================
 async def allocate_preorders(kode: str):
     """
-    Jalankan fungsi ini SETIAP kali stok untuk `kode` ditambahkan (restock).
+    Dijalankan oleh AllocationScheduler tiap ada event restock untuk `kode`
+    (jangan dipanggil paralel untuk kode yang sama; pakai bot.dispatch("restock", kode)).
+
+    Seluruh antrian diisi dalam satu commit (allocate_batch), DM dikirim
+    paralel setelahnya (fan_out); yang gagal di-refund dalam satu commit.
     """
-    # ... (Isi fungsi allocate_preorders tetap sama) ...
-    # Hitung stok dulu
-    c.execute("SELECT COUNT(*) FROM stock_items WHERE kode=?", (kode,))
-    stock_available = int(c.fetchone()[0] or 0)
-    if stock_available <= 0:
+    price, fills = await db.run(allocate_batch, kode)
+    if not fills:
         return
+    print(f"[AUTO_ALLOCATE] {kode}: {sum(f['jatah'] for f in fills)} item ke {len(fills)} PO")
+    bot.dispatch("stock_changed", kode)
 
-    # (Opsional) ambil harga untuk info
-    c.execute("SELECT harga FROM stock WHERE kode=?", (kode,))
-    pr = c.fetchone()
-    price = int(pr[0]) if pr else 0
+    async def deliver(fill):
+        jatah = fill["jatah"]
+        bought_names = "\n".join([x[1] for x in fill["items"]])
 
-    # Ambil queue PO
-    c.execute(
-        """
-        SELECT id, user_id, nama, amount 
-        FROM preorders
-        WHERE kode=? AND status='waiting'
-        ORDER BY created_at ASC, id ASC
-    """,
-        (kode,),
-    )
-    queue = c.fetchall()
+        # Cache gateway / LRU dulu; fetch ke API hanya kalau miss (dan digabung per user)
+        member = await bot.user_resolver.get(fill["user_id"])
+        
+        # Buat file txt untuk items
+        items_content = bought_names
+        items_file = io.BytesIO(items_content.encode('utf-8'))
+        
+        dm_msg = (
+            "```🛒 Pre Order Success!\n"
+            "--------------------------\n"
+            f"Code   : {kode}\n"
+            f"Amount : {jatah}\n"
+            f"Price  : {price}\n"
+            f"Total  : {price*jatah}```"
+        )
+        await rest.submit(
+            LANE_CRITICAL,
+            member.send,
+            dm_msg,
+            file=discord.File(items_file, filename=f"{kode}_{jatah}items.txt"),
+        )
 
-    for po_id, user_id, growid, amount in queue:
-        if stock_available <= 0:
-            break
+    errors = await fan_out(fills, deliver)
+    failed = [fill for fill, err in zip(fills, errors) if err is not None]
 
-        # Jatah user = min(amount, stock_available)
-        jatah = min(amount, stock_available)
-        if jatah <= 0:
-            continue
+    if failed:
+        # DM gagal -> item balik ke stock, cancel PO & refund (satu commit untuk semua)
+        # Catatan: refund = sisa PO (amount) * harga SAAT INI. Jika harga berubah sejak PO, refund mengikuti harga baru.
+        for fill, err in zip(fills, errors):
+            if err is not None:
+                print(f"[ERROR] Gagal DM user {fill['user_id']}: {err} -> Auto Cancel & Refund PO {fill['po_id']}")
 
-        # Ambil item
-        c.execute(
-            "SELECT id, nama_barang FROM stock_items WHERE kode=? ORDER BY id LIMIT ?",
-            (kode, jatah),
-        )
-        items = c.fetchall()
-        if not items or len(items) < jatah:
-            # stok berubah, refresh count & lanjut
-            c.execute("SELECT COUNT(*) FROM stock_items WHERE kode=?", (kode,))
-            stock_available = int(c.fetchone()[0] or 0)
-            continue
+        def cancel_failed(c):
+            return [cancel_fill(c, kode, price, fill) for fill in failed]
 
-        ids = [str(x[0]) for x in items]
-        bought_names = "\n".join([x[1] for x in items])
+        refunds = await db.run(cancel_failed)
+        for fill, refund_total in zip(failed, refunds):
+            print(f"[REFUND] User {fill['user_id']} direfund {refund_total} WL (PO {fill['po_id']} cancelled)")
+        # Item dari PO yang batal kembali ke stock -> jadwalkan putaran berikutnya
+        bot.dispatch("stock_changed", kode)
+        allocation.request(kode)
 
-        # Coba DM sebelum commit
-        try:
-            # Gunakan fetch_user untuk mengambil user dari API Discord (bukan hanya cache)
-            member = await bot.fetch_user(user_id)
-            
-            # Buat file txt untuk items
-            items_content = bought_names
-            items_file = io.BytesIO(items_content.encode('utf-8'))
-            
-            dm_msg = (
-                "```🛒 Pre Order Success!\n"
-                "--------------------------\n"
-                f"Code   : {kode}\n"
-                f"Amount : {jatah}\n"
-                f"Price  : {price}\n"
-                f"Total  : {price*jatah}```"
-            )
-            await member.send(dm_msg, file=discord.File(items_file, filename=f"{kode}_{jatah}items.txt"))
-        except Exception as e:
-            # DM gagal -> cancel PO & lanjut user berikutnya
-            print(f"[ERROR] Gagal DM user {user_id}: {e} -> Auto Cancel & Refund PO {po_id}")
-            
-            # --- REFUND LOGIC ---
-            # Kembalikan saldo sesuai jumlah yang tersisa di PO ini (amount) * harga saat ini (price)
-            # Catatan: Ini menggunakan harga SAAT INI. Jika harga berubah sejak PO, refund mengikuti harga baru.
-            refund_total = amount * price
-            c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (refund_total, user_id))
-            print(f"[REFUND] User {user_id} direfund {refund_total} WL (PO {po_id} cancelled)")
-            # --------------------
-
-            c.execute("UPDATE preorders SET status='cancelled' WHERE id=?", (po_id,))
-            conn.commit()
+    if not CHANNEL_TESTIMONI:
+        return
+    embeds = []
+    for fill, err in zip(fills, errors):
+        if err is not None or fill["jatah"] != fill["amount"]:
             continue
-
-        # DM sukses -> commit transaksi
-        c.execute(
-            f"DELETE FROM stock_items WHERE id IN ({','.join(['?']*len(ids))})", ids
-        )
-        c.execute(
-            "INSERT INTO transactions (user_id, kode, jumlah) VALUES (?, ?, ?)",
-            (user_id, kode, jatah),
+        jatah = fill["jatah"]
+        embed = discord.Embed(
+            title=f"#Pesanan Pre Order Number: {fill['transaction_id']}",
+            color=discord.Color.gold()
         )
-        transaction_id = c.lastrowid
+        embed.add_field(name="<a:megaphone:1419515391851626580> Pembeli", value=f"<@{fill['user_id']}> ({fill['growid']})", inline=False)
+        embed.add_field(name="Produk <a:menkrep:1122531571098980394>", value=f"{jatah} {kode}", inline=False)
+        embed.add_field(name="Total Price", value=f"{fmt_wl(price * jatah)} <a:world_lock:1419515667773657109>", inline=False)
+        embed.set_footer(text="Thanks For Purchasing Our Product(s)")
+        embeds.append(embed)
 
-        c.executemany(
-    "INSERT INTO preorder_items (preorder_id, nama_barang) VALUES (?, ?)",
-    [(po_id, x[1]) for x in items]
-)
+    def queue_testimoni(c):
+        for embed in embeds:
+            enqueue(c, "channel", CHANNEL_TESTIMONI, embed=embed, priority=PRIORITY_NORMAL)
 
-        
-        stock_available -= jatah
-
-        if jatah == amount:
-            # terpenuhi semua
-            c.execute("UPDATE preorders SET status='success' WHERE id=?", (po_id,))
-            channel = bot.get_channel(CHANNEL_TESTIMONI)
-            if channel:
-                embed = discord.Embed(
-                    title=f"#Pesanan Pre Order Number: {transaction_id}",
-                    color=discord.Color.gold()
-                )
-                embed.add_field(name="<a:megaphone:1419515391851626580> Pembeli", value=f"<@{user_id}> ({growid})", inline=False)
-                embed.add_field(name="Produk <a:menkrep:1122531571098980394>", value=f"{jatah} {kode}", inline=False)
-                embed.add_field(name="Total Price", value=f"{fmt_wl(price * jatah)} <a:world_lock:1419515667773657109>", inline=False)
-                embed.set_footer(text="Thanks For Purchasing Our Product(s)")
-                await channel.send(embed=embed)
+    if embeds:
+        await db.run(queue_testimoni)
+        bot.outbox.wake()
 
-        else:
-            # partial fulfill -> sisa tetap waiting (kurangi amount)
-            sisa = amount - jatah
-            c.execute("UPDATE preorders SET amount=? WHERE id=?", (sisa, po_id))
 
-        conn.commit()
+allocation = AllocationScheduler(allocate_preorders)
+
 
+@bot.listen("on_restock")
+async def on_restock(kode: str):
+    allocation.request(kode)
 
-@tasks.loop(seconds=10)  # jalan tiap 10 detik
+
+@bot.listen("on_preorder_placed")
+async def on_preorder_placed(kode: str):
+    allocation.request(kode)
+
+
+@tasks.loop(minutes=5)  # safety sweep, alokasi utama lewat event restock
 async def auto_allocate_po():
-    # Ambil semua kode produk yg ada preorder waiting
-    c.execute("SELECT DISTINCT kode FROM preorders WHERE status='waiting'")
-    rows = c.fetchall()
+    # Hanya kode yang punya PO waiting DAN stok tersedia
+    rows = await db.fetchall(
+        """
+        SELECT DISTINCT p.kode
+        FROM preorders p
+        JOIN stock s ON s.kode = p.kode
+        WHERE p.status='waiting' AND s.available_qty > 0
+    """
+    )
     for (kode,) in rows:
-        await allocate_preorders(kode)
+        allocation.request(kode)
 
 
 # pastikan loop auto allocate start saat bot ready
@@ -343,6 +227,7 @@ async def on_ready():
     if not auto_allocate_po.is_running():
         auto_allocate_po.start()
         print("[AUTO_ALLOCATE] Loop started")
+    bot.outbox.start()
 
     print(f"🤖 Bot ready as {bot.user}")
     
@@ -385,25 +270,28 @@ async def on_message(message: discord.Message):
         return
     growid = re.sub(r'[^a-z0-9]', '', raw_name.lower())
     if growid:
-        # cek apakah growid ada di database
-        c.execute("SELECT balance, user_id FROM users WHERE nama=?", (growid,))
-        row = c.fetchone()
-        if row:
-            new_balance = row[0] + amount
-            c.execute("UPDATE users SET balance = ? WHERE nama=?", (new_balance, growid))
-            conn.commit()
-            await message.channel.send(
+        def topup_msg(new_balance):
+            return (
                 f"✅ Topup berhasil untuk GrowID **{growid}**\n"
                 f"➕ Jumlah : {amount} WL\n"
                 f" Saldo sekarang : {new_balance} WL"
             )
-            user = await bot.fetch_user(row[1])
-            if user:
-                await user.send(
-                    f"✅ Topup berhasil untuk GrowID **{growid}**\n"
-                    f"➕ Jumlah : {amount} WL\n"
-                    f" Saldo sekarang : {new_balance} WL"
-                )
+
+        # cek apakah growid ada di database
+        def topup(c):
+            c.execute("UPDATE users SET balance = balance + ? WHERE nama=?", (amount, growid))
+            c.execute("SELECT balance, user_id FROM users WHERE nama=?", (growid,))
+            row = c.fetchone()
+            if row:
+                # DM ke user commit bareng saldo, dikirim worker outbox
+                enqueue(c, "dm", row[1], topup_msg(row[0]), priority=PRIORITY_HIGH)
+            return row
+
+        row = await db.run(topup)
+        if row:
+            new_balance = row[0]
+            bot.outbox.wake()
+            await message.channel.send(topup_msg(new_balance))
             print(f"[DEBUG] Added {amount} to {growid} (saldo sekarang {new_balance})")
             
             # Jika ada sesi deposit aktif, langsung set done agar session selesai tanpa nunggu 2 menit
@@ -448,7 +336,7 @@ async def on_command_error(ctx, error):
         raise error
 
 # Initialize UI views last
-ui_views.setup(bot, c, conn, fmt_wl, PREFIX)
+ui_views.setup(bot, db, fmt_wl, PREFIX)
 
 if __name__ == "__main__":
     bot.run(BOT_TOKEN)
\ No newline at end of file
@@ -1,28 +1,11 @@
 from discord.ext import commands
-import sqlite3
-import os
 import re
 
-DB_PATH = os.getenv("DB_PATH", "discord_sqlite_bot.db")
 EMAIL_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
 
 class AddAcc(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._init_db()
-
-    def _init_db(self):
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS accounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-        conn.close()
 
     @commands.command(name="addacc")
     async def addacc(self, ctx: commands.Context, emails: str):
@@ -34,28 +17,25 @@ class AddAcc(commands.Cog):
         if not email_list:
             return await ctx.send("❌ Tidak ada email valid di input.")
 
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-
         success = []
         duplicate = []
         invalid = []
 
-        for email in email_list:
-            if not EMAIL_RE.match(email):
-                invalid.append(email)
-                continue
-            try:
-                cur.execute("INSERT OR IGNORE INTO accounts(email) VALUES (?)", (email,))
-                if cur.rowcount == 0:
-                    duplicate.append(email)
-                else:
-                    success.append(email)
-            except Exception:
-                invalid.append(email)
-
-        conn.commit()
-        conn.close()
+        def insert_emails(cur):
+            for email in email_list:
+                if not EMAIL_RE.match(email):
+                    invalid.append(email)
+                    continue
+                try:
+                    cur.execute("INSERT OR IGNORE INTO accounts(email) VALUES (?)", (email,))
+                    if cur.rowcount == 0:
+                        duplicate.append(email)
+                    else:
+                        success.append(email)
+                except Exception:
+                    invalid.append(email)
+
+        await self.bot.db.run(insert_emails)
 
         # buat summary message
         msg = []
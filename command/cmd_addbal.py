@@ -4,13 +4,23 @@ import discord
 from utils import is_allowed_user
 import os
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the addbal command to the bot."""
 
     def normalize_name(s: str) -> str:
         import re
         return re.sub(r'[^a-z0-9]', '', (s or '').lower())
 
+    def add_balance(c, column, key, amount):
+        """Tambah saldo secara atomik. Return (before, after) atau None kalau belum terdaftar."""
+        c.execute(f"SELECT balance FROM users WHERE {column} = ?", (key,))
+        row = c.fetchone()
+        if not row:
+            return None
+        current = int(row[0] or 0)
+        c.execute(f"UPDATE users SET balance = ? WHERE {column} = ?", (current + amount, key))
+        return current, current + amount
+
     # @bot.command(name="addbal", usage=f"{PREFIX}addbal <growid/@user> <amount>")
     @bot.hybrid_command(name="addbal",
                         usage=f"{PREFIX}addbal <growid/@user> <amount>",
@@ -24,15 +34,11 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             user = ctx.message.mentions[0]
             user_id = str(user.id)
             # Langsung update berdasarkan user ID, tanpa cek GrowID
-            c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-            row = c.fetchone()
-            if not row:
+            result = await db.run(add_balance, "user_id", user_id, amount)
+            if not result:
                 await ctx.send("❌ User belum terdaftar.")
                 return
-            current = int(row[0] or 0)
-            new_balance = current + amount
-            c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-            conn.commit()
+            current, new_balance = result
             sign = "+" if amount > 0 else ""
             await ctx.send(
                 "``` Balance Updated (via User)\n"
@@ -51,15 +57,11 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         if amount == 0:
             await ctx.send("❌ Amount tidak boleh 0.")
             return
-        c.execute("SELECT balance FROM users WHERE nama = ?", (g,))
-        row = c.fetchone()
-        if not row:
+        result = await db.run(add_balance, "nama", g, amount)
+        if not result:
             await ctx.send(f"❌ GrowID `{g}` belum terdaftar. Minta user klik **SET GROWID** dulu.")
             return
-        current = int(row[0] or 0)
-        new_balance = current + amount
-        c.execute("UPDATE users SET balance = ? WHERE nama = ?", (new_balance, g))
-        conn.commit()
+        current, new_balance = result
         sign = "+" if amount > 0 else ""
         await ctx.send(
             "``` Balance Updated (via GrowID)\n"
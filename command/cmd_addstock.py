@@ -4,12 +4,45 @@ import shlex
 from utils import is_allowed_user, is_maintenance
 import os
 from dotenv import load_dotenv
+from outbox import PRIORITY_LOW, enqueue
 
 load_dotenv()
 CHANNEL_RESTOCK_NOTIF = int(os.getenv("CHANNEL_RESTOCK_NOTIF", "0"))
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the addstock command, which adds new products or items."""
+    def insert_items(c, code, items):
+        """Insert item unik (hindari duplikat). Return (added, total)."""
+        seen = set()
+        added = 0
+        for item in items:
+            if item in seen:
+                continue
+            seen.add(item)
+            c.execute("SELECT 1 FROM stock_items WHERE kode = ? AND nama_barang = ?", (code, item))
+            if c.fetchone():
+                continue  # skip duplikat
+            c.execute("INSERT INTO stock_items (kode, nama_barang) VALUES (?, ?)", (code, item))
+            added += 1
+        total = c.execute("SELECT available_qty FROM stock WHERE kode=?", (code,)).fetchone()[0]
+        return added, total
+
+    def stock_msg(code, title, added, total):
+        return (
+            "``` Stock Updated\n"
+            "--------------------------\n"
+            f"Code   : {code}\n"
+            f"Title  : {title}\n"
+            f"Added  : {added}\n"
+            f"Total  : {total}```"
+        )
+
+    def queue_restock_notice(c, code, title, added, total):
+        """Pengumuman @everyone commit bareng stoknya; dikirim worker outbox (prioritas rendah)."""
+        if CHANNEL_RESTOCK_NOTIF:
+            enqueue(c, "channel", CHANNEL_RESTOCK_NOTIF, "@everyone\n" + stock_msg(code, title, added, total),
+                    priority=PRIORITY_LOW)
+
     @bot.command(
         usage=f'{PREFIX}addstock <code> "<title>" <item1,item2,...>  OR  {PREFIX}addstock <code> <item1,item2,...>  OR  {PREFIX}addstock <code> <title> + attach .txt (1 item per line)'
     )
@@ -48,63 +81,27 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                 await ctx.send("❌ File kosong atau tidak ada item valid.")
                 return
 
-            if title_arg:
-                # produk baru atau gunakan title dari db jika sudah ada
+            def add_from_file(c):
                 c.execute("SELECT judul FROM stock WHERE kode = ?", (code,))
                 row = c.fetchone()
                 if row:
+                    # gunakan title dari db jika sudah ada
                     title = row[0]
                 else:
-                    title = title_arg
-                    c.execute("INSERT INTO stock (kode, judul, harga) VALUES (?, ?, 0)", (code, title))
-            else:
-                # jika produk belum ada, auto buat judul = kode
-                c.execute("SELECT judul FROM stock WHERE kode = ?", (code,))
-                row = c.fetchone()
-                if not row:
-                    title = code
+                    # produk baru; kalau tidak ada title, auto buat judul = kode
+                    title = title_arg or code
                     c.execute("INSERT INTO stock (kode, judul, harga) VALUES (?, ?, 0)", (code, title))
-                else:
-                    title = row[0]
+                added, total = insert_items(c, code, items)
+                queue_restock_notice(c, code, title, added, total)
+                return title, added, total
 
-            # Insert item unik (hindari duplikat)
-            seen = set()
-            added = 0
-            for item in items:
-                if item in seen:
-                    continue
-                seen.add(item)
-                c.execute("SELECT 1 FROM stock_items WHERE kode = ? AND nama_barang = ?", (code, item))
-                if c.fetchone():
-                    continue
-                c.execute("INSERT INTO stock_items (kode, nama_barang) VALUES (?, ?)", (code, item))
-                added += 1
-            conn.commit()
-            total = c.execute("SELECT COUNT(*) FROM stock_items WHERE kode=?", (code,)).fetchone()[0]
-            await ctx.send(
-                "``` Stock Updated\n"
-                "--------------------------\n"
-                f"Code   : {code}\n"
-                f"Title  : {title}\n"
-                f"Added  : {added}\n"
-                f"Total  : {total}```"
-            )
-            ch = bot.get_channel(CHANNEL_RESTOCK_NOTIF)
-            if ch:
-                await ch.send(
-                    "@everyone\n"
-                    "``` Stock Updated\n"
-                    "--------------------------\n"
-                    f"Code   : {code}\n"
-                    f"Title  : {title}\n"
-                    f"Added  : {added}\n"
-                    f"Total  : {total}```"
-                )
+            title, added, total = await db.run(add_from_file)
+            # TRIGGER ALOKASI PO OTOMATIS (event, langsung setelah commit)
+            if added:
+                bot.dispatch("restock", code)
+            bot.outbox.wake()
+            await ctx.send(stock_msg(code, title, added, total))
 
-            # TRIGGER ALOKASI PO OTOMATIS
-            if hasattr(bot, "allocate_preorders"):
-                print(f"[ADDSTOCK] Triggering allocation for {code}...")
-                await bot.allocate_preorders(code)
             return
 
         # --- Mode produk baru (pakai kutip di args) ---
@@ -128,12 +125,10 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                 await ctx.send("❌ Harus ada title dan minimal 1 item.")
                 return
             # Cek apakah kode sudah ada
-            c.execute("SELECT judul FROM stock WHERE kode = ?", (code,))
-            if c.fetchone():
+            if await db.fetchone("SELECT judul FROM stock WHERE kode = ?", (code,)):
                 await ctx.send(f"❌ Kode `{code}` sudah ada. Gunakan format tanpa kutip untuk menambah item.")
                 return
-            # Insert produk baru
-            c.execute("INSERT INTO stock (kode, judul, harga) VALUES (?, ?, 0)", (code, title))
+            new_product = True
         # --- Mode tambah item ke produk lama (tanpa kutip) ---
         else:
             parts = args.split(maxsplit=1)
@@ -147,48 +142,26 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                 await ctx.send("❌ Minimal 1 item harus disediakan.")
                 return
             # Pastikan kode sudah ada
-            c.execute("SELECT judul FROM stock WHERE kode = ?", (code,))
-            row = c.fetchone()
+            row = await db.fetchone("SELECT judul FROM stock WHERE kode = ?", (code,))
             if not row:
                 await ctx.send(f"❌ Produk dengan kode `{code}` belum ada. Gunakan format dengan kutip untuk membuat baru.")
                 return
             title = row[0]
-        # Insert item unik (hindari duplikat)
-        seen = set()
-        added = 0
-        for item in items:
-            if item in seen:
-                continue
-            seen.add(item)
-            c.execute("SELECT 1 FROM stock_items WHERE kode = ? AND nama_barang = ?", (code, item))
-            if c.fetchone():
-                continue  # skip duplikat
-            c.execute("INSERT INTO stock_items (kode, nama_barang) VALUES (?, ?)", (code, item))
-            added += 1
-        conn.commit()
-        total = c.execute("SELECT COUNT(*) FROM stock_items WHERE kode=?", (code,)).fetchone()[0]
-        await ctx.send(
-            "``` Stock Updated\n"
-            "--------------------------\n"
-            f"Code   : {code}\n"
-            f"Title  : {title}\n"
-            f"Added  : {added}\n"
-            f"Total  : {total}```"
-        )
-        ch = bot.get_channel(CHANNEL_RESTOCK_NOTIF)
-        if ch:
-            await ch.send(
-                "@everyone\n"
-                "``` Stock Updated\n"
-                "--------------------------\n"
-                f"Code   : {code}\n"
-                f"Title  : {title}\n"
-                f"Added  : {added}\n"
-                f"Total  : {total}```"
-            )
+            new_product = False
+
+        def add_items(c):
+            if new_product:
+                # Insert produk baru
+                c.execute("INSERT INTO stock (kode, judul, harga) VALUES (?, ?, 0)", (code, title))
+            added, total = insert_items(c, code, items)
+            queue_restock_notice(c, code, title, added, total)
+            return added, total
+
+        added, total = await db.run(add_items)
+        # TRIGGER ALOKASI PO OTOMATIS (event, langsung setelah commit)
+        if added:
+            bot.dispatch("restock", code)
+        bot.outbox.wake()
+        await ctx.send(stock_msg(code, title, added, total))
 
-        # TRIGGER ALOKASI PO OTOMATIS
-        if hasattr(bot, "allocate_preorders"):
-            print(f"[ADDSTOCK] Triggering allocation for {code}...")
-            await bot.allocate_preorders(code)
 
@@ -1,10 +1,13 @@
 from discord.ext import commands
 from discord import app_commands
 from utils import is_allowed_user, is_maintenance
+from locks import product_locks
+from reservations import claim_items
+from ui_views import catalog
 import os
 import discord
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the buy command."""
     @is_allowed_user()  # hanya user di ALLOWED_USERNAMES
     @is_maintenance()
@@ -15,37 +18,43 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                         description="Buy product from the bot")
     async def buy(ctx, code: str, amount: int):
         uid = ctx.author.id
-        c.execute("SELECT balance FROM users WHERE user_id = ?", (uid,))
-        row = c.fetchone()
-        if not row:
-            await ctx.send("You are not registered.")
-            return
-        balance = row[0]
-        c.execute("SELECT COUNT(*) FROM stock_items WHERE kode = ?", (code,))
-        current_stock = c.fetchone()[0]
-        if current_stock == 0 or amount > current_stock:
-            await ctx.send("Not enough stock.")
-            return
-        c.execute("SELECT harga FROM stock WHERE kode = ?", (code,))
-        r = c.fetchone()
-        if not r:
-            await ctx.send("Invalid code.")
-            return
-        price = r[0]
-        total = price * amount
-        if balance < total:
-            await ctx.send("Insufficient balance.")
-            return
-        c.execute(
-            "SELECT id, nama_barang FROM stock_items WHERE kode = ? ORDER BY id LIMIT ?",
-            (code, amount),
-        )
-        items = c.fetchall()
-        ids = [str(i[0]) for i in items]
-        c.execute(f"DELETE FROM stock_items WHERE id IN ({','.join(['?'] * len(ids))})", ids)
-        new_balance = balance - total
-        c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, uid))
-        conn.commit()
+        # Cek + klaim + potong saldo di bawah lock produk (bukan lock global)
+        async with product_locks(code):
+            row = await db.fetchone("SELECT balance FROM users WHERE user_id = ?", (uid,))
+            if not row:
+                await ctx.send("You are not registered.")
+                return
+            balance = row[0]
+            current_stock = await db.fetchval("SELECT available_qty FROM stock WHERE kode = ?", (code,), 0)
+            if current_stock == 0 or amount > current_stock:
+                await ctx.send("Not enough stock.")
+                return
+            r = await db.fetchone("SELECT harga FROM stock WHERE kode = ?", (code,))
+            if not r:
+                await ctx.send("Invalid code.")
+                return
+            price = r[0]
+            total = price * amount
+            if balance < total:
+                await ctx.send("Insufficient balance.")
+                return
+            new_balance = balance - total
+
+            def commit_purchase(c):
+                c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?", (total, uid, total))
+                if c.rowcount == 0:
+                    raise RuntimeError("balance berubah")
+                items = claim_items(c, code, amount)
+                if len(items) != amount:
+                    raise RuntimeError("stock berubah")
+                return items
+
+            try:
+                items = await db.run(commit_purchase)
+            except RuntimeError:
+                await ctx.send("Stock or balance changed, try again.")
+                return
+        bot.dispatch("stock_changed", code)
         bought_names = "\n".join([i[1] for i in items])
         await ctx.send(
             f"``` Purchase Success!\n"
@@ -57,3 +66,11 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             f"Balance: {new_balance}\n\n"
             f" Items:\n{bought_names}```"
         )
+
+    @buy.autocomplete("code")
+    async def buy_code_autocomplete(interaction: discord.Interaction, current: str):
+        # Dari index prefix di memori (kode / judul), bukan query per ketikan
+        return [
+            app_commands.Choice(name=f"{title} ({code}) | Stock: {qty} | {price} WL"[:100], value=code)
+            for code, title, qty, price in await catalog.search(current)
+        ]
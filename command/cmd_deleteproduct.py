@@ -4,7 +4,7 @@ from utils import is_allowed_user, is_maintenance
 import os
 import discord
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the deletproduct command."""
     # @bot.command(name="deletproduct", usage=f"{PREFIX}deletproduct <code>")
     @bot.hybrid_command(name="deleteproduct",
@@ -14,20 +14,20 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     @is_maintenance()
     @app_commands.guilds(discord.Object(os.getenv("SERVER_ID")))
     async def deleteproduct(ctx, code: str):
-        c.execute("SELECT judul, harga FROM stock WHERE kode = ?", (code,))
-        row = c.fetchone()
+        row = await db.fetchone("SELECT judul, harga, available_qty FROM stock WHERE kode = ?", (code,))
         if not row:
             await ctx.send(f"❌ Code **{code}** not found.")
             return
-        title, price = row[0], row[1]
-        c.execute("SELECT COUNT(*) FROM stock_items WHERE kode = ?", (code,))
-        item_count = c.fetchone()[0]
-        c.execute("DELETE FROM stock_items WHERE kode = ?", (code,))
-        c.execute("DELETE FROM stock WHERE kode = ?", (code,))
-        conn.commit()
+        title, price, item_count = row[0], row[1], row[2]
+
+        def delete_product(c):
+            c.execute("DELETE FROM stock_items WHERE kode = ?", (code,))
+            c.execute("DELETE FROM stock WHERE kode = ?", (code,))
+
+        await db.run(delete_product)
+        bot.dispatch("stock_changed", code)
         # verify
-        c.execute("SELECT 1 FROM stock WHERE kode = ?", (code,))
-        still_exists = c.fetchone()
+        still_exists = await db.fetchone("SELECT 1 FROM stock WHERE kode = ?", (code,))
         status = "Failed" if still_exists else "Success"
         await ctx.send(
             f"```️ Product Deleted\n"
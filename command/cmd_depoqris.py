@@ -11,6 +11,7 @@ import io
 from datetime import datetime, timedelta
 import qrcode
 from dotenv import load_dotenv
+from outbox import PRIORITY_HIGH, PRIORITY_NORMAL, enqueue
 
 load_dotenv()
 
@@ -29,55 +30,21 @@ CHANNEL_QRIS_SUCCESS_LOG = int(os.getenv("CHANNEL_QRIS_SUCCESS_LOG", "0"))
 
 # Globals
 bot = None
-c = None
-conn = None
+db = None
 fmt_wl = None
 PREFIX = "!"
 
-def ensure_qris_deposits_schema(cur, connection):
-    """Create qris_deposits table if not exists."""
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS qris_deposits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id TEXT UNIQUE,
-            user_id INTEGER,
-            amount_rupiah INTEGER,
-            amount_wl INTEGER,
-            status TEXT DEFAULT 'pending',
-            qr_string TEXT,
-            expired_at TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            completed_at TIMESTAMP
-        )
-    """)
-    connection.commit()
-
-def ensure_qris_rate_schema(cur, connection):
-    """Create qris_rate_settings table and ensure default row exists."""
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS qris_rate_settings (
-            id INTEGER PRIMARY KEY CHECK (id = 1),
-            rate_100_wl INTEGER NOT NULL
-        )
-    """)
-    cur.execute(
-        "INSERT OR IGNORE INTO qris_rate_settings (id, rate_100_wl) VALUES (?, ?)",
-        (RATE_SETTINGS_ID, max(1, DEFAULT_RATE_100_WL_RUPIAH))
-    )
-    connection.commit()
-
-def get_rate_100_wl() -> int:
+async def get_rate_100_wl() -> int:
     """
     Return current rate from DB as: 100 WL = Rp X.
     Falls back to default if DB is unavailable.
     """
     fallback = max(1, DEFAULT_RATE_100_WL_RUPIAH)
-    if c is None:
+    if db is None:
         return fallback
 
     try:
-        c.execute("SELECT rate_100_wl FROM qris_rate_settings WHERE id = ?", (RATE_SETTINGS_ID,))
-        row = c.fetchone()
+        row = await db.fetchone("SELECT rate_100_wl FROM qris_rate_settings WHERE id = ?", (RATE_SETTINGS_ID,))
         if row and row[0] is not None:
             return max(1, int(row[0]))
     except Exception as e:
@@ -85,9 +52,9 @@ def get_rate_100_wl() -> int:
 
     return fallback
 
-def format_rate_100_wl(rate_100_wl: int | None = None) -> str:
+async def format_rate_100_wl(rate_100_wl: int | None = None) -> str:
     """Format helper for displaying rate text in messages/logs."""
-    rate = int(rate_100_wl if rate_100_wl is not None else get_rate_100_wl())
+    rate = int(rate_100_wl if rate_100_wl is not None else await get_rate_100_wl())
     if callable(fmt_wl):
         return f"100 WL = Rp {fmt_wl(rate)}"
     return f"100 WL = Rp {rate:,}".replace(",", ".")
@@ -98,9 +65,9 @@ def mask_growid(growid: str) -> str:
         return "xxx"
     return f"{growid[0].upper()}xxx"
 
-def convert_rupiah_to_wl(rupiah_amount: int) -> int:
+async def convert_rupiah_to_wl(rupiah_amount: int) -> int:
     """Convert Rupiah to WL using dynamic rate (100 WL = Rp X)."""
-    rate_100_wl = get_rate_100_wl()
+    rate_100_wl = await get_rate_100_wl()
     return int((int(rupiah_amount) * 100) / rate_100_wl)
 
 def parse_iso_datetime(iso_string: str) -> datetime | None:
@@ -239,17 +206,16 @@ async def cancel_transaction(order_id: str, amount: int) -> bool:
 @tasks.loop(seconds=10)
 async def monitor_pending_deposits():
     """Check status of pending deposits every 10 seconds."""
-    if not c or not conn:
+    if not db:
         return
     
     try:
         # Get all pending deposits
-        c.execute("""
+        pending = await db.fetchall("""
             SELECT id, order_id, user_id, amount_rupiah, amount_wl, expired_at 
             FROM qris_deposits 
             WHERE status = 'pending'
         """)
-        pending = c.fetchall()
         
         for deposit in pending:
             dep_id, order_id, user_id, amount_rupiah, amount_wl, expired_at = deposit
@@ -258,80 +224,74 @@ async def monitor_pending_deposits():
             if expired_at:
                 exp_time = parse_iso_datetime(expired_at)
                 if exp_time and datetime.now(exp_time.tzinfo) > exp_time:
-                    c.execute("UPDATE qris_deposits SET status = 'expired' WHERE id = ?", (dep_id,))
-                    conn.commit()
+                    def expire_deposit(c):
+                        c.execute("UPDATE qris_deposits SET status = 'expired' WHERE id = ?", (dep_id,))
+                        # Notify user (lewat outbox)
+                        enqueue(c, "dm", user_id,
+                                f"Deposit QRIS `{order_id}` telah expired. Silakan buat deposit baru.",
+                                priority=PRIORITY_HIGH)
+
+                    await db.run(expire_deposit)
+                    bot.outbox.wake()
                     print(f"[QRIS] Deposit {order_id} expired")
-                    
-                    # Notify user
-                    try:
-                        user = await bot.fetch_user(user_id)
-                        await user.send(f"Deposit QRIS `{order_id}` telah expired. Silakan buat deposit baru.")
-                    except:
-                        pass
                     continue
             
             # Check payment status
             status_data = await check_transaction_status(order_id, amount_rupiah)
             if status_data and status_data.get("status") == "completed":
                 # Payment successful!
-                c.execute("""
-                    UPDATE qris_deposits 
-                    SET status = 'completed', completed_at = CURRENT_TIMESTAMP 
-                    WHERE id = ?
-                """, (dep_id,))
-                
-                # Add balance to user
-                c.execute("SELECT balance, nama FROM users WHERE user_id = ?", (user_id,))
-                row = c.fetchone()
-                if row:
+                rate_text = await format_rate_100_wl() if CHANNEL_QRIS_SUCCESS_LOG else None
+
+                def complete_deposit(c):
+                    c.execute("""
+                        UPDATE qris_deposits 
+                        SET status = 'completed', completed_at = CURRENT_TIMESTAMP 
+                        WHERE id = ?
+                    """, (dep_id,))
+
+                    # Add balance to user
+                    c.execute("SELECT balance, nama FROM users WHERE user_id = ?", (user_id,))
+                    row = c.fetchone()
+                    if not row:
+                        return None
                     new_balance = (row[0] or 0) + amount_wl
                     growid = row[1] or "Unknown"
                     c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-                    conn.commit()
-                    
-                    print(f"[QRIS] Deposit {order_id} completed! User {user_id} +{amount_wl} WL")
-                    
-                    # Notify user
-                    try:
-                        user = await bot.fetch_user(user_id)
-                        embed = discord.Embed(
-                            title="Deposit QRIS Berhasil",
-                            color=discord.Color.green()
-                        )
-                        embed.add_field(name="Order ID", value=f"`{order_id}`", inline=False)
-                        embed.add_field(name="Jumlah", value=f"Rp {amount_rupiah:,}".replace(",", "."), inline=True)
-                        embed.add_field(name="WL Diterima", value=f"+{fmt_wl(amount_wl)} WL", inline=True)
-                        embed.add_field(name="Saldo Sekarang", value=f"{fmt_wl(new_balance)} WL", inline=False)
-                        await user.send(embed=embed)
-                    except Exception as e:
-                        print(f"[QRIS] Failed to notify user {user_id}: {e}")
-                    
-                    # Send log to success channel
+
+                    # Notify user + log channel: commit bareng saldo, dikirim worker outbox
+                    embed = discord.Embed(
+                        title="Deposit QRIS Berhasil",
+                        color=discord.Color.green()
+                    )
+                    embed.add_field(name="Order ID", value=f"`{order_id}`", inline=False)
+                    embed.add_field(name="Jumlah", value=f"Rp {amount_rupiah:,}".replace(",", "."), inline=True)
+                    embed.add_field(name="WL Diterima", value=f"+{fmt_wl(amount_wl)} WL", inline=True)
+                    embed.add_field(name="Saldo Sekarang", value=f"{fmt_wl(new_balance)} WL", inline=False)
+                    enqueue(c, "dm", user_id, embed=embed, priority=PRIORITY_HIGH)
+
                     if CHANNEL_QRIS_SUCCESS_LOG:
-                        try:
-                            log_channel = bot.get_channel(CHANNEL_QRIS_SUCCESS_LOG)
-                            if log_channel:
-                                log_embed = discord.Embed(
-                                    title="Transaksi QRIS Berhasil",
-                                    color=discord.Color.green(),
-                                    timestamp=datetime.now()
-                                )
-                                log_embed.add_field(name="Order ID", value=f"`{order_id}`", inline=False)
-                                log_embed.add_field(name="User", value=f"<@{user_id}>", inline=True)
-                                log_embed.add_field(name="GrowID", value=mask_growid(growid), inline=True)
-                                log_embed.add_field(name="Total Bayar", value=f"Rp {amount_rupiah:,}".replace(",", "."), inline=True)
-                                log_embed.add_field(name="WL Diterima", value=f"{fmt_wl(amount_wl)} WL", inline=True)
-                                log_embed.add_field(
-                                    name="Konversi",
-                                    value=f"```Rp {amount_rupiah:,} -> {fmt_wl(amount_wl)} WL\n(Rate: {format_rate_100_wl()})```".replace(",", "."),
-                                    inline=False
-                                )
-                                log_embed.set_footer(text="QRIS Deposit System")
-                                await log_channel.send(embed=log_embed)
-                        except Exception as e:
-                            print(f"[QRIS] Failed to send log to channel: {e}")
-                else:
-                    conn.commit()
+                        log_embed = discord.Embed(
+                            title="Transaksi QRIS Berhasil",
+                            color=discord.Color.green(),
+                            timestamp=datetime.now()
+                        )
+                        log_embed.add_field(name="Order ID", value=f"`{order_id}`", inline=False)
+                        log_embed.add_field(name="User", value=f"<@{user_id}>", inline=True)
+                        log_embed.add_field(name="GrowID", value=mask_growid(growid), inline=True)
+                        log_embed.add_field(name="Total Bayar", value=f"Rp {amount_rupiah:,}".replace(",", "."), inline=True)
+                        log_embed.add_field(name="WL Diterima", value=f"{fmt_wl(amount_wl)} WL", inline=True)
+                        log_embed.add_field(
+                            name="Konversi",
+                            value=f"```Rp {amount_rupiah:,} -> {fmt_wl(amount_wl)} WL\n(Rate: {rate_text})```".replace(",", "."),
+                            inline=False
+                        )
+                        log_embed.set_footer(text="QRIS Deposit System")
+                        enqueue(c, "channel", CHANNEL_QRIS_SUCCESS_LOG, embed=log_embed, priority=PRIORITY_NORMAL)
+                    return new_balance
+
+                if await db.run(complete_deposit) is not None:
+                    bot.outbox.wake()
+                    print(f"[QRIS] Deposit {order_id} completed! User {user_id} +{amount_wl} WL")
                     
     except Exception as e:
         print(f"[QRIS] Monitor Error: {e}")
@@ -373,11 +333,10 @@ async def process_qris_deposit_rupiah(interaction: discord.Interaction, rupiah_a
         return False
     
     # Calculate WL amount
-    wl_amount = convert_rupiah_to_wl(rupiah_amount)
+    wl_amount = await convert_rupiah_to_wl(rupiah_amount)
     
     # Check if user registered
-    c.execute("SELECT nama FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
+    row = await db.fetchone("SELECT nama FROM users WHERE user_id = ?", (user_id,))
     if not row:
         await interaction.followup.send(
             "Kamu belum register. Klik **SET GROWID** dulu.",
@@ -446,11 +405,10 @@ async def process_qris_deposit_rupiah(interaction: discord.Interaction, rupiah_a
         return False
     
     # Save to database
-    c.execute("""
+    await db.execute("""
         INSERT INTO qris_deposits (order_id, user_id, amount_rupiah, amount_wl, status, qr_string, expired_at)
         VALUES (?, ?, ?, ?, 'pending', ?, ?)
     """, (order_id, user_id, rupiah_amount, wl_amount, qr_string, expired_at))
-    conn.commit()
     
     await interaction.followup.send(
         f"Invoice QRIS sudah dikirim ke DM kamu.\n"
@@ -463,18 +421,13 @@ async def process_qris_deposit_rupiah(interaction: discord.Interaction, rupiah_a
 # ============================================================
 # Setup function
 # ============================================================
-def setup(_bot, _c, _conn, _fmt_wl, _PREFIX):
-    global bot, c, conn, fmt_wl, PREFIX
+def setup(_bot, _db, _fmt_wl, _PREFIX):
+    global bot, db, fmt_wl, PREFIX
     bot = _bot
-    c = _c
-    conn = _conn
+    db = _db
     fmt_wl = _fmt_wl
     PREFIX = _PREFIX
     
-    # Ensure schema
-    ensure_qris_deposits_schema(c, conn)
-    ensure_qris_rate_schema(c, conn)
-    
     # Start monitor task when bot is ready
     @bot.listen('on_ready')
     async def start_qris_monitor():
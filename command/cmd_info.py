@@ -3,7 +3,7 @@ from discord import app_commands
 import discord
 import os
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the info command."""
     @bot.hybrid_command(name="info",
                         usage=f"{PREFIX}info [@user | growid]",
@@ -28,8 +28,7 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         # Cek parameter untuk mode slash
         if member:
             # Cari berdasarkan user ID
-            c.execute("SELECT nama, balance, poin FROM users WHERE user_id = ?", (member.id,))
-            row = c.fetchone()
+            row = await db.fetchone("SELECT nama, balance, poin FROM users WHERE user_id = ?", (member.id,))
             if row:
                 target_growid, balance, poin = row
                 target_display = member.mention
@@ -38,8 +37,7 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                 return
         elif growid:
             # Cari berdasarkan GrowID string
-            c.execute("SELECT nama, balance, poin FROM users WHERE nama = ?", (growid,))
-            row = c.fetchone()
+            row = await db.fetchone("SELECT nama, balance, poin FROM users WHERE nama = ?", (growid,))
             if row:
                 target_growid, balance, poin = row
                 target_display = growid
@@ -48,8 +46,7 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
                 return
         else:
             # Prefix tanpa argumen atau slash tanpa opsi: tampilkan info invoker
-            c.execute("SELECT nama, balance, poin FROM users WHERE user_id = ?", (ctx.author.id,))
-            row = c.fetchone()
+            row = await db.fetchone("SELECT nama, balance, poin FROM users WHERE user_id = ?", (ctx.author.id,))
             if row:
                 target_growid, balance, poin = row
                 target_display = ctx.author.mention
@@ -3,12 +3,14 @@ from discord.ext import commands, tasks
 from utils import is_allowed_user, is_maintenance
 from datetime import datetime
 from discord import app_commands
+from migrations import rebuild_sales_daily
+from rest_scheduler import LANE_PANEL, rest
 import os
 
 # Tuple of valid period values
 PERIODS = ("today", "week", "month", "total")
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the omset analytics command with interactive UI."""
     state = {
         "channel_id": None,
@@ -19,102 +21,65 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     # ---------------------------
     # DATA LAYER
     # ---------------------------
-    def q_sum(period: str) -> int:
+    def period_bounds(period: str, shift: str = None):
+        """
+        Rentang periode sebagai (start, end) ekspresi SQL, dipakai
+        `d.date >= start AND d.date < end` pada rollup sales_daily.
+        Setara dengan filter DATE()/strftime() lama; `shift` menggeser "now"
+        (mis. '-7 days') untuk periode sebelumnya.
+        """
+        now = "'now','localtime'" + (f",'{shift}'" if shift else "")
         if period == "today":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE DATE(t.waktu) = DATE('now','localtime')
-                """
+            return f"DATE({now})", f"DATE({now},'+1 day')"
+        if period == "week":
+            # %W mulai hari Senin dan reset di awal tahun
+            return (
+                f"MAX(DATE({now},'weekday 0','-6 days'), DATE({now},'start of year'))",
+                f"MIN(DATE({now},'weekday 0','+1 day'), DATE({now},'start of year','+1 year'))",
             )
-        elif period == "week":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE strftime('%W', t.waktu)=strftime('%W','now','localtime')
-                      AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime')
-                """
-            )
-        elif period == "month":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE strftime('%m', t.waktu)=strftime('%m','now','localtime')
-                      AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime')
-                """
-            )
-        else:
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                """
-            )
-        return int(c.fetchone()[0] or 0)
+        if period == "month":
+            return f"DATE({now},'start of month')", f"DATE({now},'start of month','+1 month')"
+        return None
 
-    def q_top_products(period: str, limit=5):
-        if period == "today":
-            where = "DATE(t.waktu) = DATE('now','localtime')"
-        elif period == "week":
-            where = "strftime('%W', t.waktu)=strftime('%W','now','localtime') AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime')"
-        elif period == "month":
-            where = "strftime('%m', t.waktu)=strftime('%m','now','localtime') AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime')"
-        else:
-            where = "1=1"
-        c.execute(
+    def period_where(period: str, shift: str = None) -> str:
+        bounds = period_bounds(period, shift)
+        if bounds is None:
+            return "1=1"
+        return f"d.date >= {bounds[0]} AND d.date < {bounds[1]}"
+
+    async def q_sum(period: str) -> int:
+        sql = f"""
+                SELECT COALESCE(SUM(d.revenue), 0)
+                FROM sales_daily d
+                WHERE {period_where(period)}
+            """
+        return int(await db.fetchval(sql, default=0))
+
+    async def q_top_products(period: str, limit=5):
+        return await db.fetchall(
             f"""
-                SELECT t.kode, SUM(t.jumlah) as qty
-                FROM transactions t
-                WHERE {where}
-                GROUP BY t.kode
+                SELECT d.kode, SUM(d.qty) as qty
+                FROM sales_daily d
+                WHERE {period_where(period)}
+                GROUP BY d.kode
                 ORDER BY qty DESC
                 LIMIT ?
             """,
             (limit,),
         )
-        return c.fetchall()
 
-    def q_prev_sum(period: str) -> int:
+    PREV_SHIFT = {"today": "-1 day", "week": "-7 days", "month": "-1 month"}
+
+    async def q_prev_sum(period: str) -> int:
         """Buat panah tren (perbandingan periode sebelumnya)."""
-        if period == "today":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE DATE(t.waktu) = DATE('now','localtime','-1 day')
-                """
-            )
-        elif period == "week":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE strftime('%W', t.waktu)=strftime('%W','now','localtime','-7 days')
-                      AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime','-7 days')
-                """
-            )
-        elif period == "month":
-            c.execute(
-                """
-                    SELECT COALESCE(SUM(t.jumlah * s.harga), 0)
-                    FROM transactions t
-                    JOIN stock s ON t.kode = s.kode
-                    WHERE strftime('%m', t.waktu)=strftime('%m','now','localtime','-1 month')
-                      AND strftime('%Y', t.waktu)=strftime('%Y','now','localtime','-1 month')
-                """
-            )
-        else:
+        if period not in PREV_SHIFT:
             return 0
-        return int(c.fetchone()[0] or 0)
+        sql = f"""
+                SELECT COALESCE(SUM(d.revenue), 0)
+                FROM sales_daily d
+                WHERE {period_where(period, PREV_SHIFT[period])}
+            """
+        return int(await db.fetchval(sql, default=0))
 
     # ---------------------------
     # PRESENTATION
@@ -145,11 +110,11 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         filled = max(1, int((value / total_qty) * 10))
         return "▮" * filled + "▯" * (10 - filled)
 
-    def build_embed(period: str) -> discord.Embed:
+    async def build_embed(period: str) -> discord.Embed:
         now = datetime.now()
-        total_now = q_sum(period)
-        total_prev = q_prev_sum(period)
-        top = q_top_products(period)
+        total_now = await q_sum(period)
+        total_prev = await q_prev_sum(period)
+        top = await q_top_products(period)
         # header & warna korporat: biru tua
         embed = discord.Embed(
             title=" Store Analytics",
@@ -197,9 +162,9 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         async def refresh(self, interaction: discord.Interaction):
             self.update_labels()
             try:
-                await interaction.response.edit_message(embed=build_embed(state["period"]), view=self)
+                await interaction.response.edit_message(embed=await build_embed(state["period"]), view=self)
             except discord.InteractionResponded:
-                await interaction.edit_original_response(embed=build_embed(state["period"]), view=self)
+                await interaction.edit_original_response(embed=await build_embed(state["period"]), view=self)
 
         @discord.ui.button(emoji="", label="Hari Ini", style=discord.ButtonStyle.secondary, custom_id="today")
         async def btn_today(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -247,11 +212,21 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         """Tampilkan panel analitik dengan UI interaktif ber-emoji."""
         state["channel_id"] = ctx.channel.id
         view = OmsetView()
-        msg = await ctx.send(embed=build_embed(state["period"]), view=view)
+        msg = await ctx.send(embed=await build_embed(state["period"]), view=view)
         state["message_id"] = msg.id
         if not _auto_refresh.is_running():
             _auto_refresh.start()
 
+    @bot.hybrid_command(name="rebuildomset",
+                        usage=f"{PREFIX}rebuildomset",
+                        description="Hitung ulang rollup omset dari semua transaksi")
+    @is_allowed_user()
+    @app_commands.guilds(discord.Object(os.getenv("SERVER_ID")))
+    async def rebuildomset(ctx: commands.Context):
+        """Backfill sales_daily (mis. setelah import/edit transaksi manual)."""
+        rows = await db.run(rebuild_sales_daily)
+        await ctx.send(f"✅ Rollup omset dihitung ulang ({rows} baris harian).")
+
     # ---------------------------
     # AUTO REFRESH LOOP (10s)
     # ---------------------------
@@ -262,12 +237,20 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
         ch = bot.get_channel(state["channel_id"])
         if not ch:
             return
+        # PartialMessage: tanpa fetch; edit lewat lane panel (digabung per pesan)
+        msg = ch.get_partial_message(state["message_id"])
+        view = OmsetView()
         try:
-            msg = await ch.fetch_message(state["message_id"])
-        except Exception:
+            await rest.submit(
+                LANE_PANEL,
+                msg.edit,
+                embed=await build_embed(state["period"]),
+                view=view,
+                bucket=("channel", ch.id),
+                key=("omset", msg.id),
+            )
+        except discord.HTTPException:
             return
-        view = OmsetView()
-        await msg.edit(embed=build_embed(state["period"]), view=view)
 
     @_auto_refresh.before_loop
     async def _before():
@@ -6,26 +6,8 @@ DEFAULT_RATE_100_WL_RUPIAH = int(os.getenv("RATE_100_WL_RUPIAH", "210"))
 RATE_SETTINGS_ID = 1
 
 
-def ensure_qris_rate_schema(cur, connection):
-    """Create qris_rate_settings table and seed default rate."""
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS qris_rate_settings (
-            id INTEGER PRIMARY KEY CHECK (id = 1),
-            rate_100_wl INTEGER NOT NULL
-        )
-        """
-    )
-    cur.execute(
-        "INSERT OR IGNORE INTO qris_rate_settings (id, rate_100_wl) VALUES (?, ?)",
-        (RATE_SETTINGS_ID, max(1, DEFAULT_RATE_100_WL_RUPIAH)),
-    )
-    connection.commit()
-
-
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register /rate command for updating QRIS WL conversion rate."""
-    ensure_qris_rate_schema(c, conn)
 
     @bot.hybrid_command(
         name="rate",
@@ -47,15 +29,13 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             await ctx.send("Nilai rate harus lebih besar dari 0.")
             return
 
-        c.execute("SELECT rate_100_wl FROM qris_rate_settings WHERE id = ?", (RATE_SETTINGS_ID,))
-        row = c.fetchone()
+        row = await db.fetchone("SELECT rate_100_wl FROM qris_rate_settings WHERE id = ?", (RATE_SETTINGS_ID,))
         old_rate = int(row[0]) if row and row[0] is not None else max(1, DEFAULT_RATE_100_WL_RUPIAH)
 
-        c.execute(
+        await db.execute(
             "INSERT OR REPLACE INTO qris_rate_settings (id, rate_100_wl) VALUES (?, ?)",
             (RATE_SETTINGS_ID, int(rupiah)),
         )
-        conn.commit()
 
         wl_per_1000 = int((1000 * 100) / int(rupiah))
         await ctx.send(
@@ -30,42 +30,25 @@ from surfercid.models import LTokenAccount
 # KONFIGURASI ENVIRONMENT
 # ================================================================
 SURFERCID_API_KEY = os.getenv("SURFERCID_API_KEY") or os.getenv("LTOKEN_API_KEY") or ""
-DB_PATH = os.getenv("DB_PATH", "discord_sqlite_bot.db")
 MAX_WORKERS = int(os.getenv("REFRESH_MAX_WORKERS", "5"))
 
 # ================================================================
-# DATABASE UTILITIES
+# DATABASE UTILITIES (lewat gateway bot.db)
 # ================================================================
-def db_connect():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
-def db_get_user_balance(conn: sqlite3.Connection, user_id: int) -> int:
-    cur = conn.cursor()
-    cur.execute("SELECT balance FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    return int(row[0]) if row and row[0] is not None else 0
-
-def db_debit(conn: sqlite3.Connection, user_id: int, amount: int) -> bool:
-    """Kurangi saldo user; return True jika berhasil, False jika saldo kurang."""
-    cur = conn.cursor()
-    cur.execute("SELECT balance FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    bal = int(row[0]) if row and row[0] is not None else 0
-    if bal < amount:
-        return False
-    new_bal = bal - amount
-    cur.execute("UPDATE users SET balance=? WHERE user_id=?", (new_bal, user_id))
-    conn.commit()
-    return True
+async def db_get_user_balance(db, user_id: int) -> int:
+    return int(await db.fetchval("SELECT balance FROM users WHERE user_id=?", (user_id,), default=0))
+
+def db_debit(cur: sqlite3.Cursor, user_id: int, amount: int) -> bool:
+    """Job writer: kurangi saldo user; return True jika berhasil, False jika saldo kurang."""
+    cur.execute(
+        "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+        (amount, user_id, amount),
+    )
+    return cur.rowcount > 0
 
-def db_credit(conn: sqlite3.Connection, user_id: int, amount: int):
-    """Rollback saldo user."""
-    cur = conn.cursor()
-    cur.execute("SELECT balance FROM users WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    bal = int(row[0]) if row and row[0] is not None else 0
-    cur.execute("UPDATE users SET balance=? WHERE user_id=?", (bal + amount, user_id))
-    conn.commit()
+def db_credit(cur: sqlite3.Cursor, user_id: int, amount: int):
+    """Job writer: rollback saldo user."""
+    cur.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (amount, user_id))
 
 # ================================================================
 # WORKER UNTUK REFRESH TOKEN
@@ -124,9 +107,9 @@ class RefreshFileCog(commands.Cog):
             await interaction.followup.send("❌ File kosong / tidak ada token valid.")
             return
 
-        conn = db_connect()
+        db = self.bot.db
         user_id = interaction.user.id
-        saldo_awal = db_get_user_balance(conn, user_id)
+        saldo_awal = await db_get_user_balance(db, user_id)
 
         progress = await interaction.followup.send(
             f"⏳ Memulai refresh {len(lines)} token...\n"
@@ -144,7 +127,7 @@ class RefreshFileCog(commands.Cog):
 
         async def process_token(token_line: str) -> Tuple[bool, str]:
             """Proses 1 token: refresh (GRATIS)"""
-            # if not db_debit(conn, user_id, 1):
+            # if not await db.run(db_debit, user_id, 1):
             #    return None, "SALDO_KURANG"
             
             def work(): return _refresh_one_token(token_line, SURFERCID_API_KEY)
@@ -153,7 +136,7 @@ class RefreshFileCog(commands.Cog):
             if ok:
                 return True, result
             else:
-                # db_credit(conn, user_id, 1) # Tidak perlu credit balik karena gratis
+                # await db.run(db_credit, user_id, 1) # Tidak perlu credit balik karena gratis
                 return False, result
 
         async def sem_task(line):
@@ -179,7 +162,7 @@ class RefreshFileCog(commands.Cog):
                 await progress.edit(content=(
                     f"⏳ Progress: {done}/{total}\n"
                     f"✅ {success} | ❌ {fail} | ⚠️ {skip}\n"
-                    f"Saldo sekarang: {db_get_user_balance(conn, user_id)} WL"
+                    f"Saldo sekarang: {await db_get_user_balance(db, user_id)} WL"
                 ))
             except Exception:
                 pass
@@ -204,7 +187,6 @@ class RefreshFileCog(commands.Cog):
                 tmp_failed = ff.name
         except Exception as e:
             await progress.edit(content=f"❌ Gagal menulis file hasil: {e}")
-            conn.close()
             return
 
         # ===============================
@@ -213,7 +195,7 @@ class RefreshFileCog(commands.Cog):
         summary = (
             f"✅ Selesai refresh {total} token.\n"
             f"Sukses: {success} | Gagal: {fail} | Skip saldo kurang: {skip}\n"
-            f"Saldo akhir: {db_get_user_balance(conn, user_id)} WL"
+            f"Saldo akhir: {await db_get_user_balance(db, user_id)} WL"
         )
 
         dm_ok = False
@@ -257,7 +239,6 @@ class RefreshFileCog(commands.Cog):
                         os.remove(f)
                     except Exception:
                         pass
-            conn.close()
 
 # ================================================================
 # REGISTER COG
@@ -4,7 +4,7 @@ from discord import app_commands
 import os
 import discord
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the setharga command."""
     # @bot.command(usage=f"{PREFIX}setharga <code> <price>")
     @bot.hybrid_command(name="setharga",
@@ -14,12 +14,11 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     @is_maintenance()
     @app_commands.guilds(discord.Object(os.getenv("SERVER_ID")))
     async def setharga(ctx, code: str, price: int):
-        c.execute("SELECT 1 FROM stock WHERE kode = ?", (code,))
-        if not c.fetchone():
+        if not await db.fetchone("SELECT 1 FROM stock WHERE kode = ?", (code,)):
             await ctx.send(f"Code {code} not found.")
             return
-        c.execute("UPDATE stock SET harga = ? WHERE kode = ?", (price, code))
-        conn.commit()
+        await db.execute("UPDATE stock SET harga = ? WHERE kode = ?", (price, code))
+        bot.dispatch("stock_changed", code)
         await ctx.send(
             f"```️ Price Updated\n"
             f"--------------------------\n"
@@ -5,7 +5,7 @@ from discord import app_commands
 import discord
 import os
 
-def setup(bot, c, conn, fmt_wl, PREFIX, DB_NAME):
+def setup(bot, db, fmt_wl, PREFIX, DB_NAME):
     """Register the status command."""
     start_time = time.time()
 
@@ -1,18 +1,79 @@
 import asyncio
 import datetime
+import hashlib
+import json
 import os
 
 import discord
 from discord import app_commands
 from discord.ext import tasks
 
-from ui_views import StockView
+from rest_scheduler import LANE_BACKGROUND, LANE_PANEL, SKIPPED, rest
+from ui_views import stock_view
 from utils import is_allowed_user, is_maintenance
 
+# Panel hanya di-edit kalau isinya berubah. Event stock/harga/penjualan
+# (on_restock, on_stock_changed) memicu refresh setelah jeda debounce singkat;
+# loop safety sweep jarang jalan dan biasanya berhenti di perbandingan hash.
+PANEL_DEBOUNCE_SECONDS = 0.5
+PANEL_SAFETY_INTERVAL_SECONDS = 60
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
-    """Register the stock command and keep one auto-refreshed stock message alive."""
-    message_cache = {"channel_id": None, "message": None}
+# Katalog dipecah jadi beberapa halaman (satu embed per pesan), tiap halaman
+# di bawah batas description embed Discord (4096). Tombol di pesan terakhir.
+PANEL_PAGE_CHARS = 4000
+PANEL_SEPARATOR = "\n" + ("=" * 28) + "\n"
+PANEL_NAME = "stock"  # key di tabel panel_messages
+PANEL_TITLE = "<a:exclamation:1419518587072282654> PRODUCT LIST <a:exclamation:1419518587072282654>"
+
+
+def layout_pages(blocks, limit=PANEL_PAGE_CHARS, separator=PANEL_SEPARATOR):
+    """Bagi blok produk (urut) ke halaman; tiap halaman hasil join <= limit karakter."""
+    pages = []
+    current, length = [], 0
+    for block in blocks:
+        block = block[:limit]
+        added = len(block) + (len(separator) if current else 0)
+        if current and length + added > limit:
+            pages.append(separator.join(current))
+            current, length = [], 0
+            added = len(block)
+        current.append(block)
+        length += added
+    if current:
+        pages.append(separator.join(current))
+    return pages
+
+
+def page_digest(embed) -> str:
+    """Hash isi halaman tanpa footer (jam Last Update)."""
+    content = embed.to_dict()
+    content.pop("footer", None)
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _save_panel(cur, channel_id, pages):
+    """pages: [(message_id, digest), ...] urut halaman."""
+    cur.execute("DELETE FROM panel_messages WHERE name=?", (PANEL_NAME,))
+    cur.executemany(
+        "INSERT INTO panel_messages (name, page, channel_id, message_id, digest) VALUES (?, ?, ?, ?, ?)",
+        [(PANEL_NAME, page, channel_id, message_id, digest) for page, (message_id, digest) in enumerate(pages)],
+    )
+
+
+def _save_digests(cur, digests):
+    cur.executemany(
+        "UPDATE panel_messages SET digest=? WHERE name=? AND page=?",
+        [(digest, PANEL_NAME, page) for page, digest in enumerate(digests)],
+    )
+
+
+def setup(bot, db, fmt_wl, PREFIX):
+    """Register the stock command and keep one auto-refreshed stock panel alive."""
+    # messages/digests: satu entry per halaman panel, urut
+    message_cache = {"channel_id": None, "messages": [], "digests": [], "is_mt": None}
+    refresh_state = {"task": None, "dirty": False}
+    cleanup_state = {"task": None}
+    panel_lock = asyncio.Lock()
     startup_stock_initialized = False
     stock_channel_id = int(os.getenv("STOCK_CHANNEL_ID", "839981631544754211"))
     server_id_raw = os.getenv("SERVER_ID", "").strip()
@@ -21,54 +82,87 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     old_delete_delay = 1.2
     bulk_delete_max_age = datetime.timedelta(days=14)
 
-    def build_embed():
-        c.execute(
+    async def build_pages():
+        """Return list embed (minimal satu), satu per halaman panel."""
+        rows = await db.fetchall(
             """
-                SELECT s.kode, s.judul, COUNT(i.id) as jumlah, s.harga
-                FROM stock s
-                LEFT JOIN stock_items i ON s.kode = i.kode
-                GROUP BY s.kode, s.judul, s.harga
-                ORDER BY s.judul ASC
+                SELECT kode, judul, available_qty AS jumlah, harga, sold_qty
+                FROM stock
+                ORDER BY judul ASC
             """
         )
-        rows = c.fetchall()
-        embed = discord.Embed(
-            title="<a:exclamation:1419518587072282654> PRODUCT LIST <a:exclamation:1419518587072282654>",
-            color=discord.Color.red(),
-        )
-        embed.set_footer(
-            text=f" Last Update: {datetime.datetime.now().strftime('%H:%M:%S')}"
-        )
-        if not rows:
-            embed.description = "Belum ada stok barang."
-            return embed
-
-        desc_parts = []
-        for kode, judul, jumlah, harga in rows:
-            try:
-                c.execute(
-                    "SELECT COALESCE(SUM(jumlah), 0) FROM transactions WHERE LOWER(kode)=LOWER(?)",
-                    (kode,),
-                )
-                sold = c.fetchone()[0]
-            except Exception:
-                c.execute(
-                    "SELECT COUNT(*) FROM transactions WHERE LOWER(kode)=LOWER(?)",
-                    (kode,),
-                )
-                sold = c.fetchone()[0]
-
+        blocks = []
+        for kode, judul, jumlah, harga, sold in rows:
             part = (
                 f"<a:toa:1122531485090582619>  **{judul}** (`{kode.upper()}`)\n"
                 f"<a:panah1:1419515217892606053>  **Stock:** `{jumlah}`\n"
                 f"<a:panah1:1419515217892606053>  **Price:** `{fmt_wl(harga)}` <a:world_lock:1419515667773657109>\n"
                 f"<a:panah1:1419515217892606053>  **Product Sold:** `{sold}`"
             )
-            desc_parts.append(part)
+            blocks.append(part)
+        descriptions = layout_pages(blocks) or ["Belum ada stok barang."]
+
+        now = datetime.datetime.now().strftime('%H:%M:%S')
+        total = len(descriptions)
+        embeds = []
+        for page, description in enumerate(descriptions, start=1):
+            embed = discord.Embed(
+                title=PANEL_TITLE if total == 1 else f"{PANEL_TITLE} ({page}/{total})",
+                description=description,
+                color=discord.Color.red(),
+            )
+            embed.set_footer(text=f" Last Update: {now}")
+            embeds.append(embed)
+        return embeds
+
+    async def send_panel(channel):
+        embeds = await build_pages()
+        is_mt = bot.maintenance.is_mt
+        messages = []
+        for i, embed in enumerate(embeds):
+            last = i == len(embeds) - 1
+            messages.append(
+                await rest.submit(
+                    LANE_PANEL,
+                    channel.send,
+                    embed=embed,
+                    view=stock_view(is_mt) if last else None,
+                    bucket=("channel", channel.id),
+                )
+            )
+        digests = [page_digest(embed) for embed in embeds]
+        message_cache["channel_id"] = channel.id
+        message_cache["messages"] = messages
+        message_cache["digests"] = digests
+        message_cache["is_mt"] = is_mt
+        await db.run(_save_panel, channel.id, [(msg.id, d) for msg, d in zip(messages, digests)])
+        return messages[-1]
 
-        separator = "\n" + ("=" * 28) + "\n"
-        embed.description = separator.join(desc_parts)
-        return embed
+    async def delete_panel():
+        """Hapus pesan panel yang sedang dilacak (sebelum kirim ulang)."""
+        for msg in message_cache["messages"]:
+            try:
+                await rest.submit(LANE_PANEL, msg.delete, bucket=("channel", message_cache["channel_id"]))
+            except discord.HTTPException:
+                pass
+        message_cache["messages"] = []
+        message_cache["digests"] = []
+
+    async def load_tracked_panel():
+        """Isi message_cache dari panel_messages (PartialMessage, tanpa fetch)."""
+        rows = await db.fetchall(
+            "SELECT channel_id, message_id, digest FROM panel_messages WHERE name=? ORDER BY page",
+            (PANEL_NAME,),
+        )
+        if not rows:
+            return
+        channel = bot.get_channel(rows[0][0])
+        if channel is None:
+            return
+        message_cache["channel_id"] = channel.id
+        message_cache["messages"] = [channel.get_partial_message(message_id) for _, message_id, _ in rows]
+        message_cache["digests"] = [digest for _, _, digest in rows]
+        message_cache["is_mt"] = None  # belum tahu -> tombol ikut di-edit sekali
 
     async def resolve_stock_channel():
         channel = bot.get_channel(stock_channel_id)
@@ -80,65 +174,182 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             print(f"[STOCK] Gagal fetch channel {stock_channel_id}: {exc}")
             return None
 
-    async def reset_stock_message(channel):
-        deleted = 0
-        deleted_old = 0
-        recent_cutoff = discord.utils.utcnow() - bulk_delete_max_age
+    async def install_panel(channel):
+        """
+        Pasang panel di `channel`: kalau panel yang dilacak sudah di channel ini,
+        edit di tempat (hanya halaman yang berubah); kalau belum, kirim baru.
+        Pesan lain di channel dibersihkan di background.
+        """
+        if message_cache["channel_id"] is None:
+            await load_tracked_panel()
 
-        while True:
-            history_batch = [msg async for msg in channel.history(limit=delete_batch_size)]
-            if not history_batch:
-                break
+        if message_cache["channel_id"] == channel.id and message_cache["messages"]:
+            await refresh_panel()
+            print(f"[STOCK] Panel di channel {channel.id} di-edit di tempat")
+        else:
+            async with panel_lock:
+                await delete_panel()
+                await send_panel(channel)
+            print(f"[STOCK] Panel baru dikirim ke channel {channel.id}")
+        start_cleanup(channel)
 
-            recent_messages = [
-                msg for msg in history_batch if msg.created_at >= recent_cutoff
-            ]
-            if not recent_messages:
-                break
+    async def cleanup_channel(channel):
+        """Hapus semua pesan selain panel: bulk untuk < 14 hari, satu-satu (pelan) untuk yang lama."""
+        keep = {msg.id for msg in message_cache["messages"]}
+        recent_cutoff = discord.utils.utcnow() - bulk_delete_max_age
+        deleted = 0
+        deleted_old = 0
+        batch = []
 
+        async def flush():
+            nonlocal deleted
+            if not batch:
+                return
             try:
-                if len(recent_messages) == 1:
-                    await recent_messages[0].delete()
+                if len(batch) == 1:
+                    await rest.submit(LANE_BACKGROUND, batch[0].delete, bucket=("channel", channel.id))
                 else:
-                    await channel.delete_messages(recent_messages)
-                deleted += len(recent_messages)
+                    await rest.submit(
+                        LANE_BACKGROUND, channel.delete_messages, list(batch), bucket=("channel", channel.id)
+                    )
+                deleted += len(batch)
             except discord.Forbidden:
                 raise
             except discord.HTTPException as exc:
                 print(f"[STOCK] Gagal bulk delete di channel {channel.id}: {exc}")
-                break
-
+            batch.clear()
             await asyncio.sleep(delete_batch_delay)
 
         async for msg in channel.history(limit=None):
+            if msg.id in keep:
+                continue
+            if msg.created_at >= recent_cutoff:
+                batch.append(msg)
+                if len(batch) >= delete_batch_size:
+                    await flush()
+                continue
+
+            await flush()
             try:
-                await msg.delete()
+                await rest.submit(LANE_BACKGROUND, msg.delete, bucket=("channel", channel.id))
                 deleted += 1
                 deleted_old += 1
             except discord.Forbidden:
                 raise
             except discord.HTTPException as exc:
                 print(f"[STOCK] Gagal hapus pesan lama di channel {channel.id}: {exc}")
-                break
-
             await asyncio.sleep(old_delete_delay)
+        await flush()
 
-        msg = await channel.send(embed=build_embed(), view=StockView())
-        message_cache["channel_id"] = channel.id
-        message_cache["message"] = msg
         print(
-            f"[STOCK] Reset stock message in channel {channel.id} "
+            f"[STOCK] Cleanup channel {channel.id} selesai "
             f"(deleted {deleted} messages, including {deleted_old} older-than-14-days messages)"
         )
-        return msg
+
+    async def run_cleanup(channel):
+        try:
+            await cleanup_channel(channel)
+        except discord.Forbidden:
+            print(f"[STOCK] Tidak punya izin hapus pesan di channel {channel.id}")
+        except Exception as exc:
+            print(f"[STOCK] Cleanup channel {channel.id} gagal: {exc}")
+
+    def start_cleanup(channel):
+        # Satu cleanup sekaligus; panel sudah live, ini jalan pelan di background
+        task = cleanup_state["task"]
+        if task is not None and not task.done():
+            return
+        cleanup_state["task"] = asyncio.create_task(run_cleanup(channel))
 
     async def post_or_refresh_stock(channel):
         if channel is None:
             return None
-        msg = await channel.send(embed=build_embed(), view=StockView())
-        message_cache["channel_id"] = channel.id
-        message_cache["message"] = msg
-        return msg
+        return await send_panel(channel)
+
+    async def refresh_panel():
+        """Edit hanya halaman yang hash-nya berubah; jumlah halaman berubah -> kirim ulang panel."""
+        if message_cache["channel_id"] is None:
+            return
+
+        async with panel_lock:
+            embeds = await build_pages()
+            digests = [page_digest(embed) for embed in embeds]
+            is_mt = bot.maintenance.is_mt
+            if digests == message_cache["digests"] and is_mt == message_cache["is_mt"]:
+                return
+
+            channel = bot.get_channel(message_cache["channel_id"])
+            if channel is None:
+                channel = await resolve_stock_channel()
+            if channel is None:
+                return
+
+            messages = message_cache["messages"]
+            if len(messages) != len(embeds):
+                await delete_panel()
+                await post_or_refresh_stock(channel)
+                return
+
+            try:
+                for i, (msg, embed, digest) in enumerate(zip(messages, embeds, digests)):
+                    last = i == len(messages) - 1
+                    # Komponen hanya dikirim ulang kalau state maintenance berubah
+                    view_changed = last and is_mt != message_cache["is_mt"]
+                    if digest == message_cache["digests"][i] and not view_changed:
+                        continue
+                    edit_kwargs = {"embed": embed}
+                    if view_changed:
+                        edit_kwargs["view"] = stock_view(is_mt)
+                    # Lane panel: kalah prioritas dari DM/interaction; kalau dibuang
+                    # (SKIPPED) digest lama dipertahankan supaya refresh berikutnya mengulang.
+                    result = await rest.submit(
+                        LANE_PANEL,
+                        msg.edit,
+                        bucket=("channel", channel.id),
+                        key=(PANEL_NAME, i),
+                        **edit_kwargs,
+                    )
+                    if result is SKIPPED:
+                        continue
+                    message_cache["digests"][i] = digest
+                    if view_changed:
+                        message_cache["is_mt"] = is_mt
+            except Exception:
+                await delete_panel()
+                await post_or_refresh_stock(channel)
+                return
+            await db.run(_save_digests, message_cache["digests"])
+
+    async def run_refresh():
+        # Event yang masuk selama refresh berjalan -> satu putaran lagi
+        while True:
+            await asyncio.sleep(PANEL_DEBOUNCE_SECONDS)
+            refresh_state["dirty"] = False
+            try:
+                await refresh_panel()
+            except Exception as exc:
+                print(f"[STOCK] Gagal refresh panel: {exc}")
+            if not refresh_state["dirty"]:
+                return
+
+    def request_refresh():
+        task = refresh_state["task"]
+        if task is not None and not task.done():
+            refresh_state["dirty"] = True
+            return
+        refresh_state["task"] = asyncio.create_task(run_refresh())
+
+    @bot.listen("on_restock")
+    async def stock_panel_on_restock(kode):
+        request_refresh()
+
+    @bot.listen("on_stock_changed")
+    async def stock_panel_on_stock_changed(kode):
+        request_refresh()
+
+    @bot.listen("on_maintenance_changed")
+    async def stock_panel_on_maintenance_changed(is_mt):
+        request_refresh()
 
     @bot.listen("on_ready")
     async def auto_post_stock_on_ready():
@@ -152,13 +363,13 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             return
 
         try:
-            await reset_stock_message(channel)
+            await install_panel(channel)
             if not update_stock.is_running():
                 update_stock.start()
         except discord.Forbidden:
-            print(f"[STOCK] Tidak punya izin clear/send di channel {stock_channel_id}")
+            print(f"[STOCK] Tidak punya izin send di channel {stock_channel_id}")
         except Exception as exc:
-            print(f"[STOCK] Gagal reset stock message: {exc}")
+            print(f"[STOCK] Gagal pasang panel stock: {exc}")
 
     guild_decorator = (
         app_commands.guilds(discord.Object(id=int(server_id_raw)))
@@ -175,26 +386,14 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     @is_maintenance()
     @guild_decorator
     async def stock(ctx):
-        """Reset channel ini dan kirim satu pesan stock baru."""
-        await reset_stock_message(ctx.channel)
+        """Pasang panel stock di channel ini (edit di tempat kalau sudah ada), lalu bersihkan channel."""
+        await install_panel(ctx.channel)
         if not update_stock.is_running():
             update_stock.start()
 
-    @tasks.loop(seconds=10)
+    @tasks.loop(seconds=PANEL_SAFETY_INTERVAL_SECONDS)  # safety sweep, refresh utama lewat event
     async def update_stock():
-        if message_cache["channel_id"] is None:
-            return
-
-        channel = bot.get_channel(message_cache["channel_id"])
-        if channel is None:
-            channel = await resolve_stock_channel()
-        if channel is None:
-            return
-
-        try:
-            await message_cache["message"].edit(embed=build_embed(), view=StockView())
-        except Exception:
-            await post_or_refresh_stock(channel)
+        await refresh_panel()
 
     @update_stock.before_loop
     async def before_update_stock():
@@ -7,7 +7,7 @@ from discord import app_commands
 import os
 import discord
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the topbal command with a paginated leaderboard."""
     class TopBalanceView(View):
         def __init__(self, data, fmt_wl, page=0):
@@ -55,8 +55,7 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     @is_maintenance()
     @app_commands.guilds(discord.Object(os.getenv("SERVER_ID")))
     async def topbal(ctx):
-        c.execute("SELECT nama, balance FROM users WHERE balance > 0 ORDER BY balance DESC")
-        rows = c.fetchall()
+        rows = await db.fetchall("SELECT nama, balance FROM users WHERE balance > 0 ORDER BY balance DESC")
         if not rows:
             await ctx.send("❌ Tidak ada data balance.")
             return
@@ -4,7 +4,7 @@ import discord
 from discord import app_commands
 import os
 
-def setup(bot, c, conn, fmt_wl, PREFIX):
+def setup(bot, db, fmt_wl, PREFIX):
     """Register the track command to show transaction or preorder details."""
     # @bot.command(usage=f"{PREFIX}track <order_id>")
     @bot.hybrid_command(name="track",
@@ -14,7 +14,7 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
     @app_commands.guilds(discord.Object(os.getenv("SERVER_ID")))
     async def track(ctx, order_id: int):
         # === Cek transaksi BUY ===
-        c.execute(
+        trx = await db.fetchone(
             """
                 SELECT t.id, u.nama, t.user_id, t.kode, t.jumlah, s.harga, t.waktu
                 FROM transactions t
@@ -24,13 +24,12 @@ def setup(bot, c, conn, fmt_wl, PREFIX):
             """,
             (order_id,),
         )
-        trx = c.fetchone()
         if trx:
             trx_id, growid, uid, kode, jumlah, harga, created = trx
             total = (harga or 0) * jumlah
             # Ambil detail item
-            c.execute("SELECT nama_barang FROM preorder_items WHERE preorder_id=?", (order_id,))
-            items = [row[0] for row in c.fetchall()]
+            rows = await db.fetchall("SELECT nama_barang FROM preorder_items WHERE preorder_id=?", (order_id,))
+            items = [row[0] for row in rows]
             item_list = "\n".join(items) if items else "    (belum terpenuhi / masih waiting)    "
             embed = discord.Embed(
                 title=f" Order Detail #{order_id}",
@@ -0,0 +1,213 @@
+"""
+Async database gateway untuk discord_sqlite_bot.db.
+
+Semua query SQLite dijalankan di thread khusus (bukan di event loop) dan
+dikembalikan sebagai awaitable. Jadi query lambat atau write lock tidak lagi
+membekukan tombol, webhook topup dan loop 10 detik.
+
+Pemakaian di handler:
+    row = await db.fetchone("SELECT balance FROM users WHERE user_id=?", (uid,))
+    await db.execute("UPDATE users SET balance=? WHERE user_id=?", (bal, uid))
+
+Beberapa statement yang harus atomik digabung dalam satu fungsi sync yang
+dijalankan lewat `db.run(fn, ...)` (commit kalau sukses, rollback kalau error).
+
+Semua tulisan (execute/run) masuk ke satu writer thread. Writer mengambil job
+dari antrian, menggabungkan job yang datang dalam beberapa milidetik ke satu
+transaksi (group commit, satu fsync), dan tiap job dibungkus SAVEPOINT sendiri
+supaya error di satu job hanya me-rollback job itu.
+
+Semua koneksi dibuat lewat `connect()` (WAL + pragma yang sudah di-tune).
+SELECT dijalankan di pool koneksi read-only, jadi panel stock dan laporan
+tidak antri di belakang pembelian.
+
+Butuh SQLite >= 3.35 (RETURNING di reservations/outbox, UPDATE ... FROM di
+migrasi). Versi library dicek di `connect()`, bukan di tengah migrasi.
+"""
+import asyncio
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DB_PATH = os.getenv("DB_PATH", "discord_sqlite_bot.db")
+
+GROUP_COMMIT_WINDOW = 0.005  # detik menunggu job lain sebelum commit
+GROUP_COMMIT_MAX_JOBS = 100  # batas job per transaksi
+
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+MMAP_SIZE = 256 * 1024 * 1024  # 256 MB memory-mapped I/O
+CACHE_SIZE_KIB = 16 * 1024  # 16 MB page cache per koneksi
+BUSY_TIMEOUT_MS = 5000
+MIN_SQLITE_VERSION = (3, 35, 0)  # RETURNING (3.35), UPDATE ... FROM (3.33)
+
+
+def check_sqlite_version():
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        raise RuntimeError(
+            f"SQLite {sqlite3.sqlite_version} terlalu lama, butuh >= {required} "
+            "(RETURNING / UPDATE ... FROM). Update Python/libsqlite3 dulu."
+        )
+
+
+def connect(path: str = DB_PATH, readonly: bool = False) -> sqlite3.Connection:
+    """
+    Factory koneksi SQLite. Pakai ini, jangan sqlite3.connect() langsung,
+    supaya semua koneksi dapat WAL + pragma yang sama.
+    """
+    check_sqlite_version()
+    if readonly:
+        uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL tersimpan di file DB; cukup diset dari koneksi tulis
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class Database:
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        # Writer: satu koneksi (autocommit, transaksi diatur manual) + antrian job.
+        # Dibuat duluan supaya file DB + mode WAL sudah ada sebelum reader buka read-only.
+        self._wconn = connect(path)
+        self._wconn.isolation_level = None
+
+        # Reader: pool thread, tiap thread punya koneksi read-only sendiri.
+        self._executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="sqlite-read")
+        self._local = threading.local()
+
+        self._jobs = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="sqlite-writer", daemon=True)
+        self._writer.start()
+
+    # ---------------------------
+    # Reader (jalan di pool sqlite-read)
+    # ---------------------------
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path, readonly=True)
+        return conn
+
+    def _fetchone(self, sql, params):
+        return self._reader().execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._reader().execute(sql, params).fetchall()
+
+    async def _submit(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # ---------------------------
+    # Writer (jalan di thread sqlite-writer)
+    # ---------------------------
+    def _writer_loop(self):
+        while True:
+            batch = [self._jobs.get()]
+            # Kumpulkan job lain yang datang dalam window singkat. Deadline dihitung
+            # sekali dari job pertama: trickle job tidak boleh memperpanjang window.
+            deadline = time.monotonic() + GROUP_COMMIT_WINDOW
+            while len(batch) < GROUP_COMMIT_MAX_JOBS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        results = []
+        try:
+            self._wconn.execute("BEGIN IMMEDIATE")
+            for fn, args, fut in batch:
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                # SAVEPOINT/RELEASE lewat cursor terpisah: cursor job tetap
+                # menyimpan rowcount/lastrowid statement terakhirnya
+                self._wconn.execute("SAVEPOINT job")
+                cur = self._wconn.cursor()
+                try:
+                    value = fn(cur, *args)
+                except Exception as e:
+                    self._wconn.execute("ROLLBACK TO job")
+                    self._wconn.execute("RELEASE job")
+                    results.append((fut, None, e))
+                    continue
+                self._wconn.execute("RELEASE job")
+                results.append((fut, value, None))
+            self._wconn.execute("COMMIT")
+        except Exception as e:
+            # BEGIN/COMMIT gagal -> seluruh batch batal
+            if self._wconn.in_transaction:
+                self._wconn.execute("ROLLBACK")
+            print(f"[DB] Group commit gagal ({len(batch)} job): {e}")
+            for _, _, fut in batch:
+                if fut.done():
+                    continue
+                if fut.running() or fut.set_running_or_notify_cancel():
+                    fut.set_exception(e)
+            return
+
+        # Resolve future setelah commit, jadi caller hanya lihat data yang sudah durable
+        for fut, value, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(value)
+
+    def _enqueue(self, fn, args) -> Future:
+        fut = Future()
+        self._jobs.put((fn, args, fut))
+        return fut
+
+    # ---------------------------
+    # API async
+    # ---------------------------
+    async def fetchone(self, sql: str, params=()):
+        return await self._submit(self._fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params=()):
+        return await self._submit(self._fetchall, sql, params)
+
+    async def fetchval(self, sql: str, params=(), default=None):
+        """Ambil kolom pertama dari baris pertama (mis. COUNT/SUM)."""
+        row = await self.fetchone(sql, params)
+        if row is None or row[0] is None:
+            return default
+        return row[0]
+
+    async def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Jalankan satu statement tulis lewat writer. Return cursor (lastrowid/rowcount)."""
+        return await self.run(_execute, sql, params)
+
+    async def run(self, fn, *args):
+        """
+        Jalankan `fn(cur, *args)` di writer thread sebagai satu job atomik.
+        Return nilai dari fn setelah group commit; exception dari fn di-raise
+        ulang setelah job di-rollback (job lain di batch yang sama tetap jalan).
+        """
+        return await asyncio.wrap_future(self._enqueue(fn, args))
+
+    def run_sync(self, fn, *args):
+        """Versi blocking dari run(), hanya untuk startup sebelum event loop jalan."""
+        return self._enqueue(fn, args).result()
+
+
+def _execute(cur, sql, params):
+    cur.execute(sql, params)
+    return cur
@@ -0,0 +1,40 @@
+"""
+Lock per key (mis. kode produk) untuk alur pembelian.
+
+Pengganti BUY_LOCK global: pembelian produk berbeda jalan paralel, pembelian
+produk yang sama tetap antri. Lock hanya dipakai untuk bagian singkat
+(cek stok + klaim item + potong saldo); DM, role dan testimoni di luar lock.
+
+    async with product_locks(kode):
+        ...
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLock:
+    """asyncio.Lock per key; entry dibuang lagi saat tidak ada yang menunggu."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, jumlah pemakai]
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
+
+    def locked(self, key) -> bool:
+        entry = self._locks.get(key)
+        return bool(entry and entry[0].locked())
+
+
+product_locks = KeyedLock()
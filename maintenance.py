@@ -0,0 +1,37 @@
+"""
+State maintenance di memori.
+
+Dibaca sekali saat startup, diubah hanya lewat `toggle()` (commit ke DB dulu,
+baru state memori diganti), lalu di-broadcast sebagai event:
+
+    bot.dispatch("maintenance_changed", is_mt)
+
+Check command (`utils.is_maintenance`) dan panel stock cukup baca
+`bot.maintenance.is_mt`, tanpa query.
+"""
+
+
+def _read(cur):
+    row = cur.execute("SELECT is_mt FROM maintenance LIMIT 1").fetchone()
+    return bool(row and row[0] == 1)
+
+
+def _toggle(cur):
+    cur.execute("UPDATE maintenance SET is_mt = 1 - is_mt")
+    row = cur.execute("SELECT is_mt FROM maintenance LIMIT 1").fetchone()
+    return None if row is None else row[0] == 1
+
+
+class MaintenanceState:
+    def __init__(self, bot, db):
+        self.bot = bot
+        self.db = db
+        self.is_mt = db.run_sync(_read)  # blocking, dipanggil saat startup
+
+    async def toggle(self):
+        """Balik state maintenance. Return state baru, atau None kalau tabel kosong."""
+        is_mt = await self.db.run(_toggle)
+        if is_mt is not None:
+            self.is_mt = is_mt
+            self.bot.dispatch("maintenance_changed", is_mt)
+        return is_mt
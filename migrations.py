@@ -0,0 +1,562 @@
+"""
+Migrasi schema discord_sqlite_bot.db.
+
+Versi schema dicatat di tabel `schema_version`. Saat startup `migrate(db)`
+cuma membaca versi terakhir lalu menjalankan step yang belum pernah jalan,
+jadi restart tidak lagi mengulang CREATE/ALTER/UPDATE full-table tiap boot.
+
+Aturan:
+- Step baru selalu ditambahkan di AKHIR `MIGRATIONS` dengan versi berikutnya.
+  Jangan ubah step yang sudah rilis.
+- Step harus idempotent (IF NOT EXISTS / cek kolom dulu), karena DB lama
+  yang dibuat sebelum ada schema_version mulai dari versi 0.
+- Tiap step jalan sebagai satu job writer: schema + catatan versinya
+  commit bareng, atau rollback bareng kalau error.
+"""
+import os
+
+DEFAULT_RATE_100_WL_RUPIAH = int(os.getenv("RATE_100_WL_RUPIAH", "210"))
+
+
+def _columns(cur, table):
+    return {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(cur, table, column, decl):
+    if column not in _columns(cur, table):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# ===== Steps =====
+def _base_schema(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS users (
+        nama TEXT PRIMARY KEY,
+        balance INTEGER DEFAULT 0
+    )"""
+    )
+    _add_column(cur, "users", "poin", "INTEGER DEFAULT 0")
+    _add_column(cur, "users", "user_id", "INTEGER")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id)")
+
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS maintenance (
+        is_mt INTEGER DEFAULT 0
+    )"""
+    )
+    cur.execute("INSERT OR IGNORE INTO maintenance (rowid, is_mt) VALUES (1, 0)")
+
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS orders (
+        order_id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        product_name TEXT,
+        qty INTEGER,
+        total INTEGER,
+        status TEXT,
+        created_at TEXT
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS pending_orders (
+        order_id TEXT PRIMARY KEY,
+        user_id INTEGER,
+        product_name TEXT,
+        qty INTEGER,
+        total INTEGER,
+        balance_before INTEGER,
+        status TEXT DEFAULT 'PENDING'
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS deposit (
+        world TEXT,
+        bot TEXT
+    )"""
+    )
+
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS stock (
+        kode TEXT PRIMARY KEY,
+        judul TEXT,
+        harga INTEGER DEFAULT 0
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS stock_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kode TEXT,
+        nama_barang TEXT
+    )"""
+    )
+
+    # Preorders (status: waiting | success | cancelled)
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS preorders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        nama TEXT,
+        kode TEXT,
+        amount INTEGER,
+        status TEXT DEFAULT 'waiting',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS preorder_items (
+        preorder_id INTEGER,
+        nama_barang TEXT
+    )"""
+    )
+
+    # Transaksi BUY + detail item
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        kode TEXT,
+        jumlah INTEGER,
+        waktu TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS transaction_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER,
+        nama_barang TEXT
+    )"""
+    )
+
+
+def _transactions_harga(cur):
+    # Backfill harga lama cukup sekali (dulu jalan full-table tiap boot).
+    # Kode lama tidak pernah mengisi harga (cuma placeholder 10 tiap boot) dan
+    # omset lama dihitung dari stock.harga, jadi semua baris diisi dari stock.
+    _add_column(cur, "transactions", "harga", "INTEGER")
+    cur.execute(
+        "UPDATE transactions SET harga = (SELECT harga FROM stock WHERE stock.kode = transactions.kode)"
+    )
+
+
+def _qris_schema(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS qris_deposits (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT UNIQUE,
+        user_id INTEGER,
+        amount_rupiah INTEGER,
+        amount_wl INTEGER,
+        status TEXT DEFAULT 'pending',
+        qr_string TEXT,
+        expired_at TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS qris_rate_settings (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        rate_100_wl INTEGER NOT NULL
+    )"""
+    )
+    cur.execute(
+        "INSERT OR IGNORE INTO qris_rate_settings (id, rate_100_wl) VALUES (1, ?)",
+        (max(1, DEFAULT_RATE_100_WL_RUPIAH),),
+    )
+
+
+def _accounts_schema(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+    )
+
+
+# Index untuk query panas. Nama + DDL di sini juga dipakai check_indexes().
+# Index baru: tambahkan di sini DAN buat step migrasi baru yang membuatnya.
+INDEXES = [
+    # SELECT id, nama_barang ... WHERE kode=? ORDER BY id LIMIT ? / COUNT(*) WHERE kode=?
+    ("idx_stock_items_kode_id", "CREATE INDEX IF NOT EXISTS idx_stock_items_kode_id ON stock_items(kode, id)"),
+    # cek duplikat addstock: WHERE kode=? AND nama_barang=?
+    ("idx_stock_items_kode_nama", "CREATE INDEX IF NOT EXISTS idx_stock_items_kode_nama ON stock_items(kode, nama_barang)"),
+    # antrian PO: WHERE kode=? AND status='waiting' ORDER BY created_at, id
+    (
+        "idx_preorders_waiting",
+        "CREATE INDEX IF NOT EXISTS idx_preorders_waiting ON preorders(kode, created_at, id) WHERE status='waiting'",
+    ),
+    # omset: range t.waktu (covering untuk SUM(jumlah) / GROUP BY kode)
+    ("idx_transactions_waktu", "CREATE INDEX IF NOT EXISTS idx_transactions_waktu ON transactions(waktu, kode, jumlah)"),
+    # monitor QRIS: WHERE status='pending'
+    (
+        "idx_qris_deposits_pending",
+        "CREATE INDEX IF NOT EXISTS idx_qris_deposits_pending ON qris_deposits(expired_at) WHERE status='pending'",
+    ),
+]
+
+
+def _hot_indexes(cur):
+    for _, ddl in INDEXES:
+        cur.execute(ddl)
+    cur.execute("ANALYZE")
+
+
+def _stock_available_qty(cur):
+    # Counter stok per produk, dijaga trigger supaya tidak perlu COUNT(*) stock_items
+    _add_column(cur, "stock", "available_qty", "INTEGER NOT NULL DEFAULT 0")
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_stock_items_insert
+        AFTER INSERT ON stock_items
+    BEGIN
+        UPDATE stock SET available_qty = available_qty + 1 WHERE kode = NEW.kode;
+    END"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_stock_items_delete
+        AFTER DELETE ON stock_items
+    BEGIN
+        UPDATE stock SET available_qty = available_qty - 1 WHERE kode = OLD.kode;
+    END"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_stock_items_move
+        AFTER UPDATE OF kode ON stock_items
+        WHEN OLD.kode IS NOT NEW.kode
+    BEGIN
+        UPDATE stock SET available_qty = available_qty - 1 WHERE kode = OLD.kode;
+        UPDATE stock SET available_qty = available_qty + 1 WHERE kode = NEW.kode;
+    END"""
+    )
+    # Produk baru: hitung item yang sudah ada duluan (mis. sisa sebelum produk dihapus)
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_stock_insert
+        AFTER INSERT ON stock
+    BEGIN
+        UPDATE stock
+        SET available_qty = (SELECT COUNT(*) FROM stock_items WHERE kode = NEW.kode)
+        WHERE kode = NEW.kode;
+    END"""
+    )
+    cur.execute(
+        """UPDATE stock
+        SET available_qty = (SELECT COUNT(*) FROM stock_items i WHERE i.kode = stock.kode)"""
+    )
+
+
+def _stock_sold_qty(cur):
+    # Counter terjual per produk (SUM transactions.jumlah, kode case-insensitive),
+    # ikut transaksi yang sama dengan insert transactions (BUY maupun PO).
+    _add_column(cur, "stock", "sold_qty", "INTEGER NOT NULL DEFAULT 0")
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_transactions_insert
+        AFTER INSERT ON transactions
+    BEGIN
+        UPDATE stock SET sold_qty = sold_qty + COALESCE(NEW.jumlah, 0)
+        WHERE kode = NEW.kode COLLATE NOCASE;
+    END"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_transactions_delete
+        AFTER DELETE ON transactions
+    BEGIN
+        UPDATE stock SET sold_qty = sold_qty - COALESCE(OLD.jumlah, 0)
+        WHERE kode = OLD.kode COLLATE NOCASE;
+    END"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_transactions_update
+        AFTER UPDATE OF kode, jumlah ON transactions
+    BEGIN
+        UPDATE stock SET sold_qty = sold_qty - COALESCE(OLD.jumlah, 0)
+        WHERE kode = OLD.kode COLLATE NOCASE;
+        UPDATE stock SET sold_qty = sold_qty + COALESCE(NEW.jumlah, 0)
+        WHERE kode = NEW.kode COLLATE NOCASE;
+    END"""
+    )
+    # Produk dibuat ulang dengan kode lama: ambil lagi histori penjualannya
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_stock_insert_sold
+        AFTER INSERT ON stock
+    BEGIN
+        UPDATE stock
+        SET sold_qty = (
+            SELECT COALESCE(SUM(jumlah), 0) FROM transactions WHERE kode = NEW.kode COLLATE NOCASE
+        )
+        WHERE kode = NEW.kode;
+    END"""
+    )
+    cur.execute(
+        """UPDATE stock SET sold_qty = s.qty
+        FROM (
+            SELECT LOWER(kode) AS k, COALESCE(SUM(jumlah), 0) AS qty
+            FROM transactions
+            GROUP BY LOWER(kode)
+        ) AS s
+        WHERE LOWER(stock.kode) = s.k"""
+    )
+
+
+def rebuild_sales_daily(cur) -> int:
+    """Hitung ulang sales_daily dari seluruh transactions. Return jumlah baris rollup."""
+    cur.execute("DELETE FROM sales_daily")
+    cur.execute(
+        """INSERT INTO sales_daily (date, kode, qty, revenue)
+        SELECT DATE(t.waktu), t.kode, COALESCE(SUM(t.jumlah), 0),
+               COALESCE(SUM(t.jumlah * COALESCE(t.harga, 0)), 0)
+        FROM transactions t
+        GROUP BY DATE(t.waktu), t.kode"""
+    )
+    return cur.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0]
+
+
+def _sales_daily(cur):
+    # Rollup harian untuk omset. date = DATE(waktu) (sama seperti filter lama),
+    # revenue = jumlah * harga produk saat transaksi masuk.
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS sales_daily (
+        date TEXT NOT NULL,
+        kode TEXT NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0,
+        revenue INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, kode)
+    )"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_daily
+        AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO sales_daily (date, kode, qty, revenue)
+        VALUES (
+            DATE(NEW.waktu), NEW.kode, COALESCE(NEW.jumlah, 0),
+            COALESCE(NEW.jumlah, 0) * COALESCE((SELECT harga FROM stock WHERE kode = NEW.kode), 0)
+        )
+        ON CONFLICT(date, kode) DO UPDATE SET
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue;
+    END"""
+    )
+    cur.execute(
+        """CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_daily
+        AFTER DELETE ON transactions
+    BEGIN
+        UPDATE sales_daily SET
+            qty = qty - COALESCE(OLD.jumlah, 0),
+            revenue = revenue - COALESCE(OLD.jumlah, 0) * COALESCE((SELECT harga FROM stock WHERE kode = OLD.kode), 0)
+        WHERE date = DATE(OLD.waktu) AND kode = OLD.kode;
+    END"""
+    )
+    rebuild_sales_daily(cur)
+
+
+def _sales_daily_prune(cur):
+    # Transaksi yang dibatalkan (kompensasi DM gagal) jangan tinggalkan baris qty 0
+    cur.execute("DROP TRIGGER IF EXISTS trg_transactions_delete_daily")
+    cur.execute(
+        """CREATE TRIGGER trg_transactions_delete_daily
+        AFTER DELETE ON transactions
+    BEGIN
+        UPDATE sales_daily SET
+            qty = qty - COALESCE(OLD.jumlah, 0),
+            revenue = revenue - COALESCE(OLD.jumlah, 0) * COALESCE((SELECT harga FROM stock WHERE kode = OLD.kode), 0)
+        WHERE date = DATE(OLD.waktu) AND kode = OLD.kode;
+        DELETE FROM sales_daily WHERE date = DATE(OLD.waktu) AND kode = OLD.kode AND qty <= 0;
+    END"""
+    )
+    cur.execute("DELETE FROM sales_daily WHERE qty <= 0")
+
+
+def _reservations(cur):
+    # Reservasi pembelian (lihat reservations.py)
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS reservations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        kode TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )"""
+    )
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS reserved_items (
+        id INTEGER PRIMARY KEY,  -- id lama di stock_items
+        reservation_id INTEGER NOT NULL,
+        kode TEXT NOT NULL,
+        nama_barang TEXT
+    )"""
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reserved_items_reservation ON reserved_items(reservation_id)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reservations_expires ON reservations(expires_at)")
+
+
+def _outbox(cur):
+    # Antrian pesan keluar (lihat outbox.py)
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,  -- 'dm' | 'channel'
+        target_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,  -- JSON: content / embed
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',  -- pending | sending | failed
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+    )
+    cur.execute(
+        """CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON outbox(priority DESC, id) WHERE status='pending'"""
+    )
+
+
+def _panel_messages(cur):
+    # Pesan panel yang dilacak (cmd_stock): di-edit di tempat, tidak dikirim ulang tiap boot
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS panel_messages (
+        name TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        digest TEXT,
+        PRIMARY KEY (name, page)
+    )"""
+    )
+
+
+def _sales_daily_harga(cur):
+    # Revenue rollup ikut transactions.harga (harga saat transaksi), bukan
+    # stock.harga saat trigger/rebuild jalan: setharga tidak lagi mengubah
+    # omset lama atau nilai yang dikurangi saat transaksi dibatalkan.
+    cur.execute(
+        """UPDATE transactions SET harga = (SELECT harga FROM stock WHERE stock.kode = transactions.kode)
+        WHERE harga IS NULL"""
+    )
+    cur.execute("DROP TRIGGER IF EXISTS trg_transactions_insert_daily")
+    cur.execute(
+        """CREATE TRIGGER trg_transactions_insert_daily
+        AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO sales_daily (date, kode, qty, revenue)
+        VALUES (
+            DATE(NEW.waktu), NEW.kode, COALESCE(NEW.jumlah, 0),
+            COALESCE(NEW.jumlah, 0) * COALESCE(NEW.harga, 0)
+        )
+        ON CONFLICT(date, kode) DO UPDATE SET
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue;
+    END"""
+    )
+    cur.execute("DROP TRIGGER IF EXISTS trg_transactions_delete_daily")
+    cur.execute(
+        """CREATE TRIGGER trg_transactions_delete_daily
+        AFTER DELETE ON transactions
+    BEGIN
+        UPDATE sales_daily SET
+            qty = qty - COALESCE(OLD.jumlah, 0),
+            revenue = revenue - COALESCE(OLD.jumlah, 0) * COALESCE(OLD.harga, 0)
+        WHERE date = DATE(OLD.waktu) AND kode = OLD.kode;
+        DELETE FROM sales_daily WHERE date = DATE(OLD.waktu) AND kode = OLD.kode AND qty <= 0;
+    END"""
+    )
+    # Koreksi manual (harga/jumlah/kode/waktu) -> keluarkan baris lama, masukkan baris baru
+    cur.execute("DROP TRIGGER IF EXISTS trg_transactions_update_daily")
+    cur.execute(
+        """CREATE TRIGGER trg_transactions_update_daily
+        AFTER UPDATE OF harga, jumlah, kode, waktu ON transactions
+    BEGIN
+        UPDATE sales_daily SET
+            qty = qty - COALESCE(OLD.jumlah, 0),
+            revenue = revenue - COALESCE(OLD.jumlah, 0) * COALESCE(OLD.harga, 0)
+        WHERE date = DATE(OLD.waktu) AND kode = OLD.kode;
+        INSERT INTO sales_daily (date, kode, qty, revenue)
+        VALUES (
+            DATE(NEW.waktu), NEW.kode, COALESCE(NEW.jumlah, 0),
+            COALESCE(NEW.jumlah, 0) * COALESCE(NEW.harga, 0)
+        )
+        ON CONFLICT(date, kode) DO UPDATE SET
+            qty = qty + excluded.qty,
+            revenue = revenue + excluded.revenue;
+        DELETE FROM sales_daily WHERE date = DATE(OLD.waktu) AND kode = OLD.kode AND qty <= 0;
+    END"""
+    )
+    # Rollup lama dihitung dari stock.harga; samakan dengan sumber harga yang baru
+    rebuild_sales_daily(cur)
+
+
+def _reservations_status(cur):
+    # held -> boleh di-sweep saat expired; delivering -> DM item sedang dikirim,
+    # sweeper tidak boleh mengembalikan itemnya (lihat reservations.begin_delivery)
+    _add_column(cur, "reservations", "status", "TEXT NOT NULL DEFAULT 'held'")
+
+
+# (versi, nama, fungsi) — urut, append-only
+MIGRATIONS = [
+    (1, "base_schema", _base_schema),
+    (2, "transactions_harga", _transactions_harga),
+    (3, "qris_schema", _qris_schema),
+    (4, "accounts_schema", _accounts_schema),
+    (5, "hot_indexes", _hot_indexes),
+    (6, "stock_available_qty", _stock_available_qty),
+    (7, "stock_sold_qty", _stock_sold_qty),
+    (8, "sales_daily", _sales_daily),
+    (9, "sales_daily_prune", _sales_daily_prune),
+    (10, "reservations", _reservations),
+    (11, "outbox", _outbox),
+    (12, "panel_messages", _panel_messages),
+    (13, "sales_daily_harga", _sales_daily_harga),
+    (14, "reservations_status", _reservations_status),
+]
+
+
+# ===== Runner =====
+def _ensure_version_table(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )"""
+    )
+    row = cur.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def _apply(cur, version, name, fn):
+    fn(cur)
+    cur.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+
+
+def migrate(db) -> int:
+    """
+    Jalankan migrasi yang belum diterapkan (blocking, panggil saat startup).
+    Return versi schema setelah migrasi.
+    """
+    current = db.run_sync(_ensure_version_table)
+    for version, name, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        print(f"[MIGRATE] v{version} {name}")
+        db.run_sync(_apply, version, name, fn)
+        current = version
+    return current
+
+
+def check_indexes(db) -> list:
+    """Laporkan index dari INDEXES yang tidak ada di DB (mis. di-drop manual)."""
+    existing = {
+        row[0]
+        for row in db.run_sync(
+            lambda cur: cur.execute("SELECT name FROM sqlite_master WHERE type='index'").fetchall()
+        )
+    }
+    missing = [name for name, _ in INDEXES if name not in existing]
+    for name in missing:
+        print(f"[DB] ⚠️ Index hilang: {name} (query terkait jadi full scan)")
+    return missing
@@ -0,0 +1,238 @@
+"""
+Antrian pesan keluar (outbox) berbasis SQLite.
+
+DM notifikasi, testimoni dan pengumuman restock tidak lagi di-await di dalam
+command. Command cukup menulis baris ke tabel `outbox` (sebaiknya di job
+writer yang sama dengan perubahan datanya, jadi commit bareng) lalu langsung
+return; worker di sini yang mengirim ke Discord.
+
+    def job(c):
+        ...
+        enqueue(c, "dm", user_id, "Saldo masuk", priority=PRIORITY_HIGH)
+    await db.run(job)
+    bot.outbox.wake()
+
+    # atau satu pesan saja:
+    await bot.outbox.send("channel", CHANNEL_TESTIMONI, embed=embed)
+
+- Prioritas: DM ke user duluan, lalu testimoni/log, broadcast terakhir.
+  Request ke Discord lewat `rest_scheduler` di lane sesuai prioritas
+  (HIGH -> critical, NORMAL -> panel, LOW -> background).
+- Gagal sementara (HTTP 5xx, timeout, dsb.) dicoba lagi dengan backoff
+  eksponensial sampai OUTBOX_MAX_ATTEMPTS. Forbidden/NotFound (DM ditutup,
+  channel hilang) langsung ditandai 'failed' tanpa retry.
+- Baris yang sudah terkirim dihapus; yang 'failed' disimpan untuk dicek.
+- Baris tetap di DB sampai terkirim, jadi restart tidak menghilangkan
+  pesan. Baris yang tertinggal 'sending' (bot mati di tengah kirim, atau
+  catatan _done/_fail gagal ditulis) dikembalikan ke 'pending' saat start
+  dan tiap dispatcher idle. Artinya at-least-once: pesan yang sudah terkirim
+  tapi gagal dicatat bisa terkirim dua kali.
+
+DM yang menentukan jadi/tidaknya transaksi (file item BuyModal, DM
+konfirmasi PO, DM item alokasi PO) TIDAK lewat sini: kalau DM itu gagal
+pembelian harus dibatalkan saat itu juga.
+"""
+import asyncio
+import json
+import os
+
+import discord
+
+from rest_scheduler import LANE_BACKGROUND, LANE_CRITICAL, LANE_PANEL, rest
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))  # maks pengiriman paralel
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = 5  # detik, dobel tiap percobaan
+OUTBOX_BACKOFF_MAX = 15 * 60
+OUTBOX_IDLE_SECONDS = 60  # cek ulang walau tidak ada wake()
+
+PRIORITY_HIGH = 10  # DM ke user
+PRIORITY_NORMAL = 5  # testimoni, log channel
+PRIORITY_LOW = 0  # broadcast (@everyone restock)
+
+
+def priority_lane(priority):
+    """Lane rest_scheduler untuk prioritas outbox."""
+    if priority >= PRIORITY_HIGH:
+        return LANE_CRITICAL
+    if priority >= PRIORITY_NORMAL:
+        return LANE_PANEL
+    return LANE_BACKGROUND
+
+
+# ---------------------------
+# Job writer (panggil lewat db.run)
+# ---------------------------
+def enqueue(cur, kind, target_id, content=None, embed=None, priority=PRIORITY_NORMAL):
+    """
+    Tulis satu pesan ke outbox. `kind` 'dm' (target_id = user id) atau
+    'channel' (target_id = channel id).
+    """
+    payload = {"content": content}
+    if embed is not None:
+        payload["embed"] = embed.to_dict()
+    cur.execute(
+        "INSERT INTO outbox (kind, target_id, payload, priority) VALUES (?, ?, ?, ?)",
+        (kind, int(target_id), json.dumps(payload), priority),
+    )
+    return cur.lastrowid
+
+
+def _claim(cur):
+    return cur.execute(
+        """
+        UPDATE outbox SET status='sending', attempts = attempts + 1
+        WHERE id = (
+            SELECT id FROM outbox
+            WHERE status='pending' AND next_attempt_at <= datetime('now')
+            ORDER BY priority DESC, id LIMIT 1
+        )
+        RETURNING id, kind, target_id, payload, priority, attempts
+        """
+    ).fetchone()
+
+
+def _done(cur, outbox_id):
+    cur.execute("DELETE FROM outbox WHERE id=?", (outbox_id,))
+
+
+def _fail(cur, outbox_id, error, retry_in):
+    if retry_in is None:
+        cur.execute(
+            "UPDATE outbox SET status='failed', last_error=? WHERE id=?", (error, outbox_id)
+        )
+    else:
+        cur.execute(
+            """
+            UPDATE outbox SET status='pending', last_error=?, next_attempt_at = datetime('now', ?)
+            WHERE id=?
+            """,
+            (error, f"+{int(retry_in)} seconds", outbox_id),
+        )
+
+
+def _reset_sending(cur, active=()):
+    """Baris 'sending' yang tidak sedang dikirim proses ini -> 'pending' lagi."""
+    active = list(active)
+    cur.execute(
+        f"""
+        UPDATE outbox SET status='pending'
+        WHERE status='sending' AND id NOT IN ({','.join('?' * len(active))})
+        """,
+        active,
+    )
+    return cur.rowcount
+
+
+# ---------------------------
+# Worker
+# ---------------------------
+class Outbox:
+    def __init__(self, bot, db, workers: int = OUTBOX_WORKERS):
+        self.bot = bot
+        self.db = db
+        self._slots = asyncio.Semaphore(workers)
+        self._wake = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+        self._sending = set()  # outbox id yang sedang dikirim (status 'sending' milik kita)
+
+    def start(self):
+        """Jalankan dispatcher (idempotent, aman dipanggil tiap on_ready)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Beri tahu dispatcher ada baris baru (panggil setelah db.run(... enqueue ...))."""
+        self._wake.set()
+
+    async def send(self, kind, target_id, content=None, embed=None, priority=PRIORITY_NORMAL):
+        """Enqueue satu pesan (job writer sendiri) lalu wake()."""
+        outbox_id = await self.db.run(enqueue, kind, target_id, content, embed, priority)
+        self.wake()
+        return outbox_id
+
+    async def _run(self):
+        resumed = await self.db.run(_reset_sending)
+        if resumed:
+            print(f"[OUTBOX] {resumed} pesan dikirim ulang setelah restart")
+        while True:
+            # clear sebelum claim: enqueue yang masuk setelah ini pasti membangunkan lagi
+            self._wake.clear()
+            await self._slots.acquire()
+            try:
+                row = await self.db.run(_claim)
+            except Exception as e:
+                print(f"[OUTBOX] Gagal ambil antrian: {e}")
+                row = None
+            if row is None:
+                self._slots.release()
+                await self._idle()
+                continue
+            self._sending.add(row[0])
+            task = asyncio.create_task(self._deliver(*row))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _idle(self):
+        # Baris 'sending' yatim (catatan hasil kirim gagal ditulis) dikirim ulang
+        try:
+            stale = await self.db.run(_reset_sending, list(self._sending))
+            if stale:
+                print(f"[OUTBOX] {stale} pesan tertahan 'sending' dikembalikan ke antrian")
+        except Exception as e:
+            print(f"[OUTBOX] Gagal requeue pesan 'sending': {e}")
+        # Tidur sampai ada wake() atau baris retry berikutnya jatuh tempo
+        wait = await self.db.fetchval(
+            """
+            SELECT (julianday(MIN(next_attempt_at)) - julianday('now')) * 86400
+            FROM outbox WHERE status='pending'
+            """,
+            default=OUTBOX_IDLE_SECONDS,
+        )
+        wait = min(max(float(wait), 0.5), OUTBOX_IDLE_SECONDS)
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _deliver(self, outbox_id, kind, target_id, payload, priority, attempts):
+        try:
+            await self._send(kind, target_id, json.loads(payload), priority)
+        except Exception as e:
+            permanent = isinstance(e, (discord.Forbidden, discord.NotFound))
+            if permanent or attempts >= OUTBOX_MAX_ATTEMPTS:
+                retry_in = None
+                print(f"[OUTBOX] Gagal kirim {kind} {target_id} (#{outbox_id}), menyerah: {e}")
+            else:
+                retry_in = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+                print(f"[OUTBOX] Gagal kirim {kind} {target_id} (#{outbox_id}), retry {retry_in}s: {e}")
+            await self._record(_fail, outbox_id, str(e)[:500], retry_in)
+        else:
+            await self._record(_done, outbox_id)
+        finally:
+            self._sending.discard(outbox_id)
+            self._slots.release()
+            self.wake()
+
+    async def _record(self, job, outbox_id, *args):
+        # Gagal tulis -> baris tetap 'sending'; _idle mengembalikannya ke antrian
+        try:
+            await self.db.run(job, outbox_id, *args)
+        except Exception as e:
+            print(f"[OUTBOX] Gagal catat hasil kirim #{outbox_id} ({job.__name__}): {e}")
+
+    async def _send(self, kind, target_id, payload, priority=PRIORITY_NORMAL):
+        if kind == "dm":
+            dest = await self.bot.user_resolver.get(target_id)
+        else:
+            dest = self.bot.get_channel(target_id) or await self.bot.fetch_channel(target_id)
+
+        embed = payload.get("embed")
+        await rest.submit(
+            priority_lane(priority),
+            dest.send,
+            payload.get("content"),
+            embed=discord.Embed.from_dict(embed) if embed else None,
+            bucket=(kind, int(target_id)),
+        )
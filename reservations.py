@@ -0,0 +1,178 @@
+"""
+Reservasi item untuk pembelian (dua fase).
+
+1. reserve : klaim item stock_items -> reserved_items + potong saldo.
+             Satu job writer, selesai dalam milidetik (di bawah product lock).
+2. confirm : DM sukses -> catat transactions/transaction_items, hapus reservasi.
+   release : DM gagal / timeout -> item balik ke stock_items (id lama, tetap di
+             depan antrian) dan saldo dikembalikan.
+
+Reservasi yang tidak di-confirm/release sebelum `expires_at` (mis. bot restart
+sebelum DM dikirim) dikembalikan oleh `sweep_expired`.
+
+Sebelum DM item dikirim, `begin_delivery` menandai reservasi 'delivering'.
+Sweeper melewati reservasi ini: item yang sudah (mungkin) sampai ke pembeli
+tidak boleh balik ke stock dan saldonya tidak boleh di-refund. Kalau reservasi
+keburu di-sweep, begin_delivery gagal dan DM tidak dikirim. Reservasi yang
+tertinggal 'delivering' (bot mati saat DM) dilaporkan `stale_deliveries` untuk
+dicek admin, karena status DM-nya tidak diketahui.
+
+`claim_items` / `restore_items` adalah rutinitas klaim bersama (dipakai juga
+oleh alokasi PO dan cmd_buy): ambil N item dalam satu statement, bukan
+SELECT + DELETE id IN (...) + insert per item.
+
+Semua fungsi di sini adalah job writer: panggil lewat `db.run(fn, ...)`.
+"""
+
+RESERVATION_TTL_SECONDS = 300
+
+
+class ReserveError(Exception):
+    """Reservasi ditolak; pesan siap dikirim ke user."""
+
+
+def claim_items(cur, kode, amount):
+    """Hapus & kembalikan `amount` item terlama untuk `kode`: [(id, nama_barang), ...] urut id."""
+    items = cur.execute(
+        """
+        DELETE FROM stock_items
+        WHERE id IN (SELECT id FROM stock_items WHERE kode=? ORDER BY id LIMIT ?)
+        RETURNING id, nama_barang
+        """,
+        (kode, amount),
+    ).fetchall()
+    items.sort()
+    return items
+
+
+def restore_items(cur, kode, items):
+    """Kebalikan claim_items: item kembali dengan id lama (tetap di depan antrian)."""
+    cur.executemany(
+        "INSERT INTO stock_items (id, kode, nama_barang) VALUES (?, ?, ?)",
+        [(item_id, kode, nama_barang) for item_id, nama_barang in items],
+    )
+
+
+def reserve(cur, user_id, kode, amount, ttl=RESERVATION_TTL_SECONDS):
+    """Return (reservation_id, price, [(item_id, nama_barang), ...])."""
+    row = cur.execute("SELECT harga, available_qty FROM stock WHERE kode=?", (kode,)).fetchone()
+    if not row:
+        raise ReserveError("❌ Invalid product code.")
+    price, available = int(row[0] or 0), int(row[1] or 0)
+    if available < amount:
+        raise ReserveError(f"❌ Stock tidak cukup. Tersisa: {available}")
+
+    total = price * amount
+    cur.execute(
+        "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+        (total, user_id, total),
+    )
+    if cur.rowcount == 0:
+        raise ReserveError("❌ Balance kurang.")
+
+    cur.execute(
+        """
+        INSERT INTO reservations (user_id, kode, amount, total, expires_at)
+        VALUES (?, ?, ?, ?, datetime('now', ?))
+        """,
+        (user_id, kode, amount, total, f"+{int(ttl)} seconds"),
+    )
+    reservation_id = cur.lastrowid
+
+    items = claim_items(cur, kode, amount)
+    if len(items) < amount:
+        raise ReserveError("❌ Stock berubah, coba lagi.")
+    cur.executemany(
+        "INSERT INTO reserved_items (id, reservation_id, kode, nama_barang) VALUES (?, ?, ?, ?)",
+        [(item_id, reservation_id, kode, nama_barang) for item_id, nama_barang in items],
+    )
+    return reservation_id, price, items
+
+
+def begin_delivery(cur, reservation_id):
+    """Tandai reservasi 'delivering' sebelum DM item. Return False kalau sudah di-sweep/dibatalkan."""
+    cur.execute(
+        "UPDATE reservations SET status='delivering' WHERE id=? AND status='held'", (reservation_id,)
+    )
+    return cur.rowcount == 1
+
+
+def confirm(cur, reservation_id, bonus_wl=0, bonus_poin=0):
+    """
+    Item sudah terkirim: catat transaksi + bonus poin. Return transaction_id,
+    atau None kalau reservasi sudah tidak ada (keburu di-sweep).
+    """
+    row = cur.execute(
+        "SELECT user_id, kode, amount, total FROM reservations WHERE id=?", (reservation_id,)
+    ).fetchone()
+    if not row:
+        return None
+    user_id, kode, amount, total = row
+
+    # harga = harga saat reserve (bukan stock.harga sekarang); dipakai rollup omset
+    cur.execute(
+        "INSERT INTO transactions (user_id, kode, jumlah, harga) VALUES (?, ?, ?, ?)",
+        (user_id, kode, amount, total // amount if amount else 0),
+    )
+    transaction_id = cur.lastrowid
+    cur.execute(
+        """
+        INSERT INTO transaction_items (transaction_id, nama_barang)
+        SELECT ?, nama_barang FROM reserved_items WHERE reservation_id=? ORDER BY id
+        """,
+        (transaction_id, reservation_id),
+    )
+    if bonus_wl or bonus_poin:
+        cur.execute(
+            "UPDATE users SET balance = balance + ?, poin = COALESCE(poin, 0) + ? WHERE user_id=?",
+            (bonus_wl, bonus_poin, user_id),
+        )
+    _drop(cur, reservation_id)
+    return transaction_id
+
+
+def release(cur, reservation_id):
+    """Batalkan reservasi: item balik ke stock, saldo dikembalikan. Return True kalau ada yang dibatalkan."""
+    row = cur.execute(
+        "SELECT user_id, total FROM reservations WHERE id=?", (reservation_id,)
+    ).fetchone()
+    if not row:
+        return False
+    user_id, total = row
+
+    cur.execute(
+        """
+        INSERT INTO stock_items (id, kode, nama_barang)
+        SELECT id, kode, nama_barang FROM reserved_items WHERE reservation_id=?
+        """,
+        (reservation_id,),
+    )
+    cur.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (total, user_id))
+    _drop(cur, reservation_id)
+    return True
+
+
+def sweep_expired(cur):
+    """Release semua reservasi yang lewat expires_at. Return list kode yang stoknya kembali."""
+    expired = cur.execute(
+        "SELECT id, kode FROM reservations WHERE expires_at <= datetime('now') AND status='held'"
+    ).fetchall()
+    for reservation_id, _ in expired:
+        release(cur, reservation_id)
+    return [kode for _, kode in expired]
+
+
+def stale_deliveries(cur):
+    """Reservasi 'delivering' yang sudah lewat expires_at: [(id, user_id, kode, amount), ...]."""
+    return cur.execute(
+        """
+        SELECT id, user_id, kode, amount FROM reservations
+        WHERE status='delivering' AND expires_at <= datetime('now')
+        ORDER BY id
+        """
+    ).fetchall()
+
+
+def _drop(cur, reservation_id):
+    cur.execute("DELETE FROM reserved_items WHERE reservation_id=?", (reservation_id,))
+    cur.execute("DELETE FROM reservations WHERE id=?", (reservation_id,))
@@ -0,0 +1,215 @@
+"""
+Penjadwal request REST keluar ke Discord, dengan lane prioritas.
+
+Semua kiriman/edit yang bukan respon langsung interaction lewat sini,
+supaya edit kosmetik (panel stock, omset, countdown) tidak menunda DM item
+pembeli:
+
+    LANE_CRITICAL    : DM item / konfirmasi pembelian & PO, DM outbox prioritas tinggi
+    LANE_INTERACTION : update pesan interaction (status deposit, dsb.)
+    LANE_PANEL       : refresh panel stock/omset, testimoni, expiry countdown
+    LANE_BACKGROUND  : broadcast & bersih-bersih channel (hapus pesan lama)
+
+    msg = await rest.submit(LANE_CRITICAL, user.send, content, file=f)
+    await rest.submit(LANE_PANEL, msg.edit, embed=e, bucket=("channel", ch.id), key="stock-panel:0")
+
+Aturan:
+- Lane dilayani urut prioritas. Lane PANEL/BACKGROUND hanya jalan kalau
+  budget global masih di atas LOW_LANE_RESERVE (sisanya dijaga untuk lane atas).
+- Budget global (token bucket GLOBAL_RATE/detik, di bawah global limit
+  Discord 50/detik) + bucket per route (`bucket=`, mis. ("channel", id):
+  5 request / 5 detik). Job yang bucket-nya habis dilewati, job lain di
+  belakangnya tetap jalan. Bucket yang sudah penuh lagi (route idle) dibuang
+  tiap BUCKET_PRUNE_INTERVAL; bucket penuh sama dengan bucket baru, jadi
+  tidak ada limit yang hilang dan dict tidak tumbuh per user yang pernah di-DM.
+- `key=` : job kosmetik yang bisa digabung. Submit baru dengan key yang sama
+  menggantikan job lama yang belum jalan (yang lama selesai dengan SKIPPED);
+  job ber-key di lane PANEL/BACKGROUND yang menunggu lebih dari LOW_MAX_WAIT
+  dibuang (SKIPPED). Job tanpa key tidak pernah dibuang.
+- Retry 429 per route tetap ditangani HTTP client discord.py; scheduler ini
+  menjaga supaya burst tidak sampai ke sana.
+
+Respon awal interaction (response.send_message / defer / send_modal) TIDAK
+lewat sini: wajib dalam 3 detik dan tidak memakai budget global bot.
+"""
+import asyncio
+import time
+from collections import deque
+
+LANE_CRITICAL = 0
+LANE_INTERACTION = 1
+LANE_PANEL = 2
+LANE_BACKGROUND = 3
+
+GLOBAL_RATE = 40  # request / detik
+LOW_LANE_RESERVE = 10  # token yang tidak boleh dipakai lane PANEL/BACKGROUND
+BUCKET_RATE = (5, 5.0)  # (request, detik) per bucket route
+MAX_INFLIGHT = 8
+LOW_MAX_WAIT = 30  # detik
+SCAN_LIMIT = 50  # job per lane yang dicek tiap putaran
+BUCKET_PRUNE_INTERVAL = 60  # detik
+
+SKIPPED = object()  # hasil submit untuk job yang digabung/dibuang
+
+
+class _TokenBucket:
+    def __init__(self, capacity, per):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def available(self, now) -> float:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def wait_for(self, now, need) -> float:
+        """Detik sampai `need` token tersedia."""
+        return max(0.0, (need - self.available(now)) / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Job:
+    __slots__ = ("lane", "fn", "args", "kwargs", "bucket", "key", "fut", "created")
+
+    def __init__(self, lane, fn, args, kwargs, bucket, key, fut):
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.bucket = bucket
+        self.key = key
+        self.fut = fut
+        self.created = time.monotonic()
+
+
+class RestScheduler:
+    def __init__(self):
+        self._lanes = [deque() for _ in range(LANE_BACKGROUND + 1)]
+        self._keyed = {}  # key -> job yang masih antri
+        self._global = _TokenBucket(GLOBAL_RATE, 1.0)
+        self._buckets = {}  # bucket -> _TokenBucket
+        self._next_prune = time.monotonic() + BUCKET_PRUNE_INTERVAL
+        self._slots = asyncio.Semaphore(MAX_INFLIGHT)
+        self._wake = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    async def submit(self, lane, fn, *args, bucket=None, key=None, **kwargs):
+        """
+        Jadwalkan `await fn(*args, **kwargs)` di `lane`. Return hasil fn,
+        atau SKIPPED kalau job digabung/dibuang. Exception dari fn di-raise ulang.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        job = _Job(lane, fn, args, kwargs, bucket, key, fut)
+        if key is not None:
+            old = self._keyed.get(key)
+            if old is not None and not old.fut.done():
+                old.fut.set_result(SKIPPED)
+            self._keyed[key] = job
+        self._lanes[lane].append(job)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+        return await fut
+
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+    # ---------------------------
+    # Dispatcher
+    # ---------------------------
+    async def _run(self):
+        while self.pending():
+            self._wake.clear()
+            job, wait = self._pick(time.monotonic())
+            if job is None:
+                if wait is None:
+                    continue  # semua yang tersisa sudah selesai/dibuang
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._slots.acquire()
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    def _pick(self, now):
+        """Return (job, None) yang siap jalan, atau (None, detik tunggu terpendek)."""
+        wait = None
+        if now >= self._next_prune:
+            self._prune_buckets(now)
+
+        def later(seconds):
+            nonlocal wait
+            wait = seconds if wait is None else min(wait, seconds)
+
+        for lane_no, lane in enumerate(self._lanes):
+            low = lane_no >= LANE_PANEL
+            need = LOW_LANE_RESERVE + 1 if low else 1
+            scanned = 0
+            for job in list(lane):
+                if scanned >= SCAN_LIMIT:
+                    break
+                if job.fut.done():
+                    self._forget(lane, job)
+                    continue
+                if low and job.key is not None and now - job.created > LOW_MAX_WAIT:
+                    job.fut.set_result(SKIPPED)
+                    self._forget(lane, job)
+                    continue
+                scanned += 1
+                if self._global.available(now) < need:
+                    later(self._global.wait_for(now, need))
+                    break  # lane ini (dan yang di bawahnya) kehabisan budget global
+                bucket = self._bucket(job.bucket)
+                if bucket is not None and bucket.available(now) < 1:
+                    later(bucket.wait_for(now, 1))
+                    continue
+                self._global.take()
+                if bucket is not None:
+                    bucket.take()
+                self._forget(lane, job)
+                return job, None
+        return None, wait
+
+    def _bucket(self, key):
+        if key is None:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _TokenBucket(*BUCKET_RATE)
+        return bucket
+
+    def _prune_buckets(self, now):
+        for key, bucket in list(self._buckets.items()):
+            if bucket.available(now) >= bucket.capacity:
+                del self._buckets[key]
+        self._next_prune = now + BUCKET_PRUNE_INTERVAL
+
+    def _forget(self, lane, job):
+        lane.remove(job)
+        if job.key is not None and self._keyed.get(job.key) is job:
+            del self._keyed[job.key]
+
+    async def _execute(self, job):
+        try:
+            result = await job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            if not job.fut.done():
+                job.fut.set_exception(e)
+        else:
+            if not job.fut.done():
+                job.fut.set_result(result)
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+
+rest = RestScheduler()
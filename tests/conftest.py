@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Modul bot ada di root repo (flat), bukan package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Database baru di file sementara, sudah dimigrasi ke versi terakhir."""
+    database = Database(str(tmp_path / "test.db"))
+    migrate(database)
+    return database
+
+
+def run(coro):
+    """Jalankan coroutine di event loop baru (tanpa pytest-asyncio)."""
+    return asyncio.run(coro)
+
+
+def seed(cur, kode="dl", harga=10, items=5, users=((1, 1000),)):
+    """Satu produk dengan `items` item + user (user_id, balance). Job writer."""
+    cur.execute("INSERT INTO stock (kode, judul, harga) VALUES (?, ?, ?)", (kode, kode.upper(), harga))
+    cur.executemany(
+        "INSERT INTO stock_items (kode, nama_barang) VALUES (?, ?)",
+        [(kode, f"{kode}-{i}") for i in range(items)],
+    )
+    cur.executemany(
+        "INSERT INTO users (nama, user_id, balance) VALUES (?, ?, ?)",
+        [(f"user{user_id}", user_id, balance) for user_id, balance in users],
+    )
@@ -0,0 +1,56 @@
+from conftest import run, seed
+from allocation import allocate_batch, cancel_fill
+from reservations import claim_items, restore_items
+
+
+def place(cur, *orders):
+    cur.executemany(
+        "INSERT INTO preorders (user_id, nama, kode, amount) VALUES (?, ?, 'dl', ?)",
+        [(user_id, f"user{user_id}", amount) for user_id, amount in orders],
+    )
+
+
+def preorders(db):
+    return run(db.fetchall("SELECT user_id, amount, status FROM preorders ORDER BY id"))
+
+
+def test_claim_and_restore_keep_fifo_order(db):
+    db.run_sync(seed)
+    items = db.run_sync(claim_items, "dl", 3)
+    assert [name for _, name in items] == ["dl-0", "dl-1", "dl-2"]
+
+    db.run_sync(restore_items, "dl", items)
+    assert run(db.fetchval("SELECT available_qty FROM stock WHERE kode='dl'")) == 5
+    assert [name for _, name in db.run_sync(claim_items, "dl", 1)] == ["dl-0"]
+
+
+def test_allocate_batch_fills_queue_fifo_with_partial(db):
+    db.run_sync(seed, "dl", 10, 4, ((1, 0), (2, 0), (3, 0)))
+    db.run_sync(place, (1, 1), (2, 5), (3, 2))
+
+    price, fills = db.run_sync(allocate_batch, "dl")
+    assert price == 10
+    assert [(f["user_id"], f["jatah"]) for f in fills] == [(1, 1), (2, 3)]
+    assert [name for _, name in fills[1]["items"]] == ["dl-1", "dl-2", "dl-3"]
+    assert preorders(db) == [(1, 1, "success"), (2, 2, "waiting"), (3, 2, "waiting")]
+    assert run(db.fetchval("SELECT available_qty FROM stock WHERE kode='dl'")) == 0
+    assert db.run_sync(allocate_batch, "dl") == (0, [])
+
+
+def test_cancel_fill_returns_items_and_refunds_remaining_po(db):
+    db.run_sync(seed, "dl", 10, 2, ((1, 0),))
+    db.run_sync(place, (1, 3))
+    price, [fill] = db.run_sync(allocate_batch, "dl")
+    assert fill["jatah"] == 2
+
+    refund = db.run_sync(cancel_fill, "dl", price, fill)
+    assert refund == 30
+    assert run(db.fetchval("SELECT balance FROM users WHERE user_id=1")) == 30
+    assert preorders(db) == [(1, 3, "cancelled")]
+    assert run(db.fetchone(
+        """
+        SELECT (SELECT available_qty FROM stock WHERE kode='dl'),
+               (SELECT COUNT(*) FROM transactions),
+               (SELECT COUNT(*) FROM preorder_items)
+        """
+    )) == (2, 0, 0)
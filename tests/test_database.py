@@ -0,0 +1,74 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from conftest import run
+
+
+def test_execute_returns_rowcount_and_lastrowid(db):
+    async def main():
+        cur = await db.execute("INSERT INTO users (user_id, balance) VALUES (?, ?)", (1, 10))
+        assert cur.lastrowid is not None
+        assert cur.rowcount == 1
+        cur = await db.execute("UPDATE users SET balance = balance + 5 WHERE user_id=?", (1,))
+        assert cur.rowcount == 1
+        cur = await db.execute("UPDATE users SET balance = 0 WHERE user_id=?", (999,))
+        assert cur.rowcount == 0
+
+    run(main())
+
+
+def test_failed_job_rolls_back_only_itself(db):
+    def good(cur, user_id):
+        cur.execute("INSERT INTO users (user_id, balance) VALUES (?, 0)", (user_id,))
+
+    def bad(cur):
+        cur.execute("INSERT INTO users (user_id, balance) VALUES (2, 0)")
+        raise ValueError("gagal")
+
+    async def main():
+        results = await asyncio.gather(
+            db.run(good, 1), db.run(bad), db.run(good, 3), return_exceptions=True
+        )
+        assert isinstance(results[1], ValueError)
+        rows = await db.fetchall("SELECT user_id FROM users ORDER BY user_id")
+        assert [r[0] for r in rows] == [1, 3]
+
+    run(main())
+
+
+def test_constraint_error_is_raised_to_caller(db):
+    async def main():
+        await db.execute("INSERT INTO users (user_id, balance) VALUES (1, 0)")
+        with pytest.raises(sqlite3.IntegrityError):
+            await db.execute("INSERT INTO users (user_id, balance) VALUES (1, 0)")
+        assert await db.fetchval("SELECT COUNT(*) FROM users") == 1
+
+    run(main())
+
+
+def test_old_sqlite_is_rejected(monkeypatch, tmp_path):
+    import database
+
+    monkeypatch.setattr(database.sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(RuntimeError, match="3.35"):
+        database.connect(str(tmp_path / "old.db"))
+
+
+def test_group_commit_window_is_not_extended_by_trickle(db, monkeypatch):
+    import database
+
+    monkeypatch.setattr(database, "GROUP_COMMIT_WINDOW", 0.05)
+
+    def noop(cur):
+        return time.monotonic()
+
+    # Job baru tiap 20 ms (< window): tanpa deadline, job pertama menunggu sampai trickle berhenti
+    start = time.monotonic()
+    first = db._enqueue(noop, ())
+    for _ in range(15):
+        time.sleep(0.02)
+        db._enqueue(noop, ())
+    assert first.result() - start < 0.15
@@ -0,0 +1,117 @@
+import asyncio
+
+import discord
+
+import outbox
+from conftest import run
+from outbox import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, _claim, _done, _fail, _reset_sending, enqueue
+from rest_scheduler import RestScheduler
+
+
+def rows(db):
+    return run(db.fetchall("SELECT id, status, attempts FROM outbox ORDER BY id"))
+
+
+def test_claim_orders_by_priority_then_id(db):
+    db.run_sync(enqueue, "channel", 100, "low", None, PRIORITY_LOW)
+    db.run_sync(enqueue, "channel", 100, "normal")
+    db.run_sync(enqueue, "dm", 1, "high", None, PRIORITY_HIGH)
+    db.run_sync(enqueue, "dm", 2, "high2", None, PRIORITY_HIGH)
+
+    claimed = [db.run_sync(_claim)[0] for _ in range(4)]
+    assert claimed == [3, 4, 2, 1]
+    assert db.run_sync(_claim) is None
+    assert {status for _, status, _ in rows(db)} == {"sending"}
+
+
+def test_fail_backs_off_or_gives_up(db):
+    db.run_sync(enqueue, "dm", 1, "a")
+    db.run_sync(enqueue, "dm", 2, "b")
+    first, second = db.run_sync(_claim)[0], db.run_sync(_claim)[0]
+
+    db.run_sync(_fail, first, "503", 60)
+    db.run_sync(_fail, second, "403", None)
+    assert rows(db) == [(1, "pending", 1), (2, "failed", 1)]
+    # belum jatuh tempo -> tidak di-claim
+    assert db.run_sync(_claim) is None
+
+
+def test_reset_sending_skips_rows_in_flight(db):
+    for target in (1, 2, 3):
+        db.run_sync(enqueue, "dm", target, "x")
+        db.run_sync(_claim)
+    assert db.run_sync(_reset_sending, [2]) == 2
+    assert rows(db) == [(1, "pending", 1), (2, "sending", 1), (3, "pending", 1)]
+    db.run_sync(_done, 2)
+    assert [r[0] for r in rows(db)] == [1, 3]
+
+
+class Dest:
+    def __init__(self, log, target_id, fail=None):
+        self.log, self.target_id, self.fail = log, target_id, fail
+
+    async def send(self, content=None, embed=None):
+        if self.fail:
+            raise self.fail
+        self.log.append((self.target_id, content))
+
+
+class Bot:
+    def __init__(self, fail=None):
+        self.log = []
+        self.fail = fail or {}
+        bot = self
+
+        class Resolver:
+            async def get(self, user_id):
+                return Dest(bot.log, user_id, bot.fail.get(user_id))
+
+        self.user_resolver = Resolver()
+
+    def get_channel(self, channel_id):
+        return Dest(self.log, channel_id, self.fail.get(channel_id))
+
+
+def deliver_all(db, bot, monkeypatch, seconds=0.3):
+    monkeypatch.setattr(outbox, "rest", RestScheduler())
+
+    async def main():
+        box = outbox.Outbox(bot, db, workers=2)
+        box.start()
+        await asyncio.sleep(seconds)
+        box._task.cancel()
+        return box
+
+    return run(main())
+
+
+def test_outbox_delivers_and_marks_permanent_failures(db, monkeypatch):
+    forbidden = discord.Forbidden(type("R", (), {"status": 403, "reason": "x"})(), "closed")
+    bot = Bot({3: forbidden})
+    db.run_sync(enqueue, "channel", 100, "testi", None, PRIORITY_NORMAL)
+    db.run_sync(enqueue, "dm", 1, "poin", None, PRIORITY_HIGH)
+    db.run_sync(enqueue, "dm", 3, "closed", None, PRIORITY_HIGH)
+
+    deliver_all(db, bot, monkeypatch)
+    assert sorted(bot.log) == [(1, "poin"), (100, "testi")]
+    assert run(db.fetchall("SELECT target_id, status FROM outbox")) == [(3, "failed")]
+
+
+def test_outbox_requeues_row_when_bookkeeping_fails(db, monkeypatch):
+    bot = Bot()
+    db.run_sync(enqueue, "dm", 1, "poin", None, PRIORITY_HIGH)
+    calls = []
+
+    def flaky_done(cur, outbox_id):
+        calls.append(outbox_id)
+        if len(calls) == 1:
+            raise RuntimeError("disk I/O error")
+        _done(cur, outbox_id)
+
+    monkeypatch.setattr(outbox, "_done", flaky_done)
+    monkeypatch.setattr(outbox, "OUTBOX_IDLE_SECONDS", 0.05)
+    deliver_all(db, bot, monkeypatch, seconds=1.5)
+
+    # at-least-once: terkirim lagi setelah requeue, lalu tercatat selesai
+    assert bot.log == [(1, "poin"), (1, "poin")]
+    assert rows(db) == []
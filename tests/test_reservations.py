@@ -0,0 +1,98 @@
+import pytest
+
+from conftest import run, seed
+from reservations import (
+    ReserveError,
+    begin_delivery,
+    confirm,
+    release,
+    reserve,
+    stale_deliveries,
+    sweep_expired,
+)
+
+
+def state(db, kode="dl", user_id=1):
+    return run(db.fetchone(
+        """
+        SELECT (SELECT available_qty FROM stock WHERE kode=?),
+               (SELECT COUNT(*) FROM stock_items WHERE kode=?),
+               (SELECT balance FROM users WHERE user_id=?),
+               (SELECT COUNT(*) FROM reservations),
+               (SELECT COUNT(*) FROM reserved_items)
+        """,
+        (kode, kode, user_id),
+    ))
+
+
+def expire(cur):
+    cur.execute("UPDATE reservations SET expires_at = datetime('now', '-1 second')")
+
+
+def test_reserve_claims_oldest_items_and_debits(db):
+    db.run_sync(seed)
+    reservation_id, price, items = db.run_sync(reserve, 1, "dl", 2)
+    assert price == 10
+    assert [name for _, name in items] == ["dl-0", "dl-1"]
+    assert state(db) == (3, 3, 980, 1, 2)
+
+
+@pytest.mark.parametrize(
+    "amount, balance, message",
+    [(6, 1000, "Stock tidak cukup"), (2, 15, "Balance kurang")],
+)
+def test_reserve_rejected_leaves_nothing_behind(db, amount, balance, message):
+    db.run_sync(seed, "dl", 10, 5, ((1, balance),))
+    with pytest.raises(ReserveError, match=message):
+        db.run_sync(reserve, 1, "dl", amount)
+    assert state(db) == (5, 5, balance, 0, 0)
+
+
+def test_confirm_records_transaction_and_bonus(db):
+    db.run_sync(seed)
+    reservation_id, _, _ = db.run_sync(reserve, 1, "dl", 2)
+    transaction_id = db.run_sync(confirm, reservation_id, 2, 2)
+
+    assert state(db) == (3, 3, 982, 0, 0)
+    names = run(db.fetchall(
+        "SELECT nama_barang FROM transaction_items WHERE transaction_id=? ORDER BY id", (transaction_id,)
+    ))
+    assert [n for (n,) in names] == ["dl-0", "dl-1"]
+    assert run(db.fetchval("SELECT poin FROM users WHERE user_id=1")) == 2
+
+
+def test_release_restores_items_in_front_and_refunds(db):
+    db.run_sync(seed)
+    reservation_id, _, _ = db.run_sync(reserve, 1, "dl", 2)
+    assert db.run_sync(release, reservation_id) is True
+    assert db.run_sync(release, reservation_id) is False
+    assert state(db) == (5, 5, 1000, 0, 0)
+
+    _, _, items = db.run_sync(reserve, 1, "dl", 1)
+    assert items[0][1] == "dl-0"
+
+
+def test_sweep_releases_expired_held_reservation(db):
+    db.run_sync(seed)
+    reservation_id, _, _ = db.run_sync(reserve, 1, "dl", 2)
+    assert db.run_sync(sweep_expired) == []
+    db.run_sync(expire)
+    assert db.run_sync(sweep_expired) == ["dl"]
+    assert state(db) == (5, 5, 1000, 0, 0)
+    # sudah di-sweep -> DM item tidak boleh dikirim, confirm tidak mencatat apa pun
+    assert db.run_sync(begin_delivery, reservation_id) is False
+    assert db.run_sync(confirm, reservation_id) is None
+
+
+def test_sweep_skips_reservation_being_delivered(db):
+    db.run_sync(seed)
+    reservation_id, _, _ = db.run_sync(reserve, 1, "dl", 2)
+    assert db.run_sync(begin_delivery, reservation_id) is True
+    assert db.run_sync(begin_delivery, reservation_id) is False
+    db.run_sync(expire)
+
+    assert db.run_sync(sweep_expired) == []
+    assert db.run_sync(stale_deliveries) == [(reservation_id, 1, "dl", 2)]
+    assert db.run_sync(confirm, reservation_id) is not None
+    assert state(db) == (3, 3, 980, 0, 0)
+    assert db.run_sync(stale_deliveries) == []
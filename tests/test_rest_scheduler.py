@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+import rest_scheduler
+from conftest import run
+from rest_scheduler import (
+    LANE_BACKGROUND,
+    LANE_CRITICAL,
+    LANE_INTERACTION,
+    LANE_PANEL,
+    SKIPPED,
+    RestScheduler,
+)
+
+
+def recorder():
+    log = []
+
+    async def call(name):
+        log.append(name)
+        return name
+
+    return log, call
+
+
+def exhausted():
+    """Scheduler tanpa budget global: semua job antri dulu, baru jalan saat token terisi."""
+    sched = RestScheduler()
+    sched._global.tokens = 0
+    return sched
+
+
+def test_lanes_run_in_priority_order():
+    log, call = recorder()
+
+    async def main():
+        sched = exhausted()
+        return await asyncio.gather(
+            sched.submit(LANE_BACKGROUND, call, "bg"),
+            sched.submit(LANE_PANEL, call, "panel"),
+            sched.submit(LANE_INTERACTION, call, "interaction"),
+            sched.submit(LANE_CRITICAL, call, "critical"),
+        )
+
+    assert run(main()) == ["bg", "panel", "interaction", "critical"]
+    assert log == ["critical", "interaction", "panel", "bg"]
+
+
+def test_same_key_coalesces_to_latest():
+    log, call = recorder()
+
+    async def main():
+        sched = exhausted()
+        return await asyncio.gather(
+            *(sched.submit(LANE_PANEL, call, f"edit{i}", key=("stock", 0)) for i in range(5)),
+            sched.submit(LANE_PANEL, call, "other", key=("stock", 1)),
+        )
+
+    results = run(main())
+    assert results[:4] == [SKIPPED] * 4
+    assert results[4:] == ["edit4", "other"]
+    assert sorted(log) == ["edit4", "other"]
+
+
+def test_stale_keyed_low_lane_job_is_dropped(monkeypatch):
+    monkeypatch.setattr(rest_scheduler, "LOW_MAX_WAIT", 0.05)
+    log, call = recorder()
+
+    async def main():
+        sched = exhausted()
+        return await asyncio.gather(
+            sched.submit(LANE_PANEL, call, "keyed", key="omset"),
+            sched.submit(LANE_BACKGROUND, call, "unkeyed"),
+            sched.submit(LANE_CRITICAL, call, "critical", key="dm"),
+        )
+
+    # panel ber-key dibuang; tanpa key & lane atas tetap jalan walau lama menunggu
+    assert run(main()) == [SKIPPED, "unkeyed", "critical"]
+    assert log == ["critical", "unkeyed"]
+
+
+def test_route_bucket_spaces_requests_without_blocking_others(monkeypatch):
+    monkeypatch.setattr(rest_scheduler, "BUCKET_RATE", (2, 0.2))
+    stamps = []
+
+    async def call(name):
+        stamps.append((name, time.monotonic()))
+
+    async def main():
+        sched = RestScheduler()
+        start = time.monotonic()
+        await asyncio.gather(
+            *(sched.submit(LANE_CRITICAL, call, "ch1", bucket=("channel", 1)) for _ in range(4)),
+            sched.submit(LANE_PANEL, call, "ch2", bucket=("channel", 2)),
+        )
+        return start
+
+    start = run(main())
+    ch1 = [t - start for name, t in stamps if name == "ch1"]
+    ch2 = [t - start for name, t in stamps if name == "ch2"]
+    assert ch1[1] < 0.05 and ch1[2] >= 0.09 and ch1[3] >= 0.19
+    assert ch2[0] < ch1[2]
+
+
+def test_exception_is_raised_to_caller():
+    async def boom():
+        raise ValueError("gagal")
+
+    async def main():
+        sched = RestScheduler()
+        with pytest.raises(ValueError):
+            await sched.submit(LANE_CRITICAL, boom)
+        assert sched.pending() == 0
+
+    run(main())
+
+
+def test_idle_route_buckets_are_evicted(monkeypatch):
+    monkeypatch.setattr(rest_scheduler, "BUCKET_RATE", (5, 0.05))
+    monkeypatch.setattr(rest_scheduler, "BUCKET_PRUNE_INTERVAL", 0.02)
+    monkeypatch.setattr(rest_scheduler, "GLOBAL_RATE", 10_000)
+    _, call = recorder()
+    sizes = []
+
+    async def main():
+        sched = RestScheduler()
+        # DM ke 300 user berbeda, satu bucket ("dm", user_id) per user
+        for user_id in range(300):
+            await sched.submit(LANE_CRITICAL, call, user_id, bucket=("dm", user_id))
+            sizes.append(len(sched._buckets))
+            if user_id % 10 == 9:
+                await asyncio.sleep(0.03)
+
+    run(main())
+    assert max(sizes) <= 40
+    assert sizes[-1] < 300
+
+
+def test_prune_keeps_buckets_that_are_still_limiting():
+    sched = RestScheduler()
+    now = time.monotonic()
+    busy = sched._bucket(("channel", 1))
+    busy.take()
+    sched._bucket(("channel", 2))
+    sched._prune_buckets(now)
+    assert list(sched._buckets) == [("channel", 1)]
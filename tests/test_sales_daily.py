@@ -0,0 +1,92 @@
+from conftest import run, seed
+from allocation import allocate_batch, cancel_fill
+from migrations import rebuild_sales_daily
+from reservations import confirm, reserve
+
+
+def rollup(db):
+    return run(db.fetchall("SELECT kode, qty, revenue FROM sales_daily ORDER BY kode"))
+
+
+def set_price(cur, kode, harga):
+    cur.execute("UPDATE stock SET harga=? WHERE kode=?", (harga, kode))
+
+
+def test_confirm_records_price_at_reserve_time(db):
+    db.run_sync(seed)
+    reservation_id, price, _ = db.run_sync(reserve, 1, "dl", 2)
+    db.run_sync(set_price, "dl", 99)
+    transaction_id = db.run_sync(confirm, reservation_id)
+
+    assert run(db.fetchval("SELECT harga FROM transactions WHERE id=?", (transaction_id,))) == price == 10
+    assert rollup(db) == [("dl", 2, 20)]
+
+
+def test_setharga_does_not_change_past_revenue(db):
+    db.run_sync(seed)
+    reservation_id, _, _ = db.run_sync(reserve, 1, "dl", 3)
+    db.run_sync(confirm, reservation_id)
+    db.run_sync(set_price, "dl", 50)
+
+    assert db.run_sync(rebuild_sales_daily) == 1
+    assert rollup(db) == [("dl", 3, 30)]
+
+
+def test_cancel_fill_after_setharga_subtracts_original_revenue(db):
+    db.run_sync(seed, "dl", 10, 4, ((1, 1000), (2, 1000)))
+
+    def place(cur):
+        cur.execute("INSERT INTO preorders (user_id, nama, kode, amount) VALUES (1, 'user1', 'dl', 1)")
+        cur.execute("INSERT INTO preorders (user_id, nama, kode, amount) VALUES (2, 'user2', 'dl', 2)")
+
+    db.run_sync(place)
+    price, fills = db.run_sync(allocate_batch, "dl")
+    assert [f["jatah"] for f in fills] == [1, 2]
+    assert rollup(db) == [("dl", 3, 30)]
+
+    db.run_sync(set_price, "dl", 70)
+    db.run_sync(cancel_fill, "dl", price, fills[1])
+    assert rollup(db) == [("dl", 1, 10)]
+
+
+def test_upgraded_legacy_db_keeps_stock_price_revenue(tmp_path):
+    from database import Database
+    from migrations import _base_schema, migrate
+
+    # DB lama (sebelum schema_version): harga placeholder 10 dari boot lama
+    legacy = Database(str(tmp_path / "legacy.db"))
+
+    def old_bot(cur):
+        _base_schema(cur)
+        cur.execute("ALTER TABLE transactions ADD COLUMN harga INTEGER")
+        cur.execute("INSERT INTO stock (kode, judul, harga) VALUES ('dl', 'DL', 500)")
+        cur.execute("INSERT INTO transactions (user_id, kode, jumlah) VALUES (1, 'dl', 3)")
+        cur.execute("UPDATE transactions SET harga = 10 WHERE harga IS NULL")
+
+    legacy.run_sync(old_bot)
+    migrate(legacy)
+    assert rollup(legacy) == [("dl", 3, 1500)]
+    assert run(legacy.fetchval("SELECT harga FROM transactions")) == 500
+
+
+def test_update_moves_revenue_between_rollup_rows(db):
+    db.run_sync(seed, "dl", 10, 0)
+    db.run_sync(seed, "wl", 30, 0, ())
+
+    def sell(cur):
+        cur.execute("INSERT INTO transactions (user_id, kode, jumlah, harga) VALUES (1, 'dl', 2, 10)")
+
+    db.run_sync(sell)
+    assert rollup(db) == [("dl", 2, 20)]
+
+    def fix(cur, sql):
+        cur.execute(sql)
+
+    db.run_sync(fix, "UPDATE transactions SET harga = 15")
+    assert rollup(db) == [("dl", 2, 30)]
+    db.run_sync(fix, "UPDATE transactions SET jumlah = 3")
+    assert rollup(db) == [("dl", 3, 45)]
+    db.run_sync(fix, "UPDATE transactions SET kode = 'wl'")
+    assert rollup(db) == [("wl", 3, 45)]
+    assert db.run_sync(rebuild_sales_daily) == 1
+    assert rollup(db) == [("wl", 3, 45)]
@@ -0,0 +1,59 @@
+"""
+Timer pusat untuk aksi tertunda yang murah (mis. edit "Expired" pesan
+ephemeral setelah 30 detik).
+
+Satu task untuk semua timer: deadline disimpan di heap, task tidur sampai
+deadline terdekat lalu menjalankan callback-nya. Tidak ada coroutine/sleep
+per pesan, dan tidak ada tick kalau tidak ada timer.
+
+    timer_wheel.call_later(30, expire_message, interaction)
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class TimerWheel:
+    def __init__(self):
+        self._heap = []  # (deadline, seq, fn, args)
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def call_later(self, delay: float, fn, *args):
+        """Jadwalkan `await fn(*args)` setelah `delay` detik."""
+        deadline = time.monotonic() + delay
+        heapq.heappush(self._heap, (deadline, next(self._seq), fn, args))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        elif self._heap[0][0] == deadline:
+            self._wake.set()  # deadline baru paling dekat -> bangunkan
+
+    def __len__(self):
+        return len(self._heap)
+
+    async def _run(self):
+        while self._heap:
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, fn, args = heapq.heappop(self._heap)
+            task = asyncio.create_task(self._fire(fn, args))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, fn, args):
+        try:
+            await fn(*args)
+        except Exception as e:
+            print(f"[TIMER] Callback {getattr(fn, '__name__', fn)} gagal: {e}")
+
+
+timer_wheel = TimerWheel()
@@ -6,7 +6,7 @@
 # - BUY PO (Pre Order) maksimal 10 per user per produk
 #   * DM konfirmasi wajib aktif (kalau DM mati -> PO dibatalkan)
 #   * Ada nomor antrian pada saat pencatatan PO
-#   * Alokasi otomatis saat restock lewat allocate_preorders(kode)
+#   * Alokasi otomatis saat restock lewat event bot.dispatch("restock", kode)
 #   * Partial fulfill: kalau stok nggak cukup, sisa tetap waiting
 #   * DM hasil (success / partial). Kalau DM gagal saat fulfillment -> cancel & kembalikan stok
 # - ProductSelect (BUY) & ProductSelectPO (BUY PO)
@@ -19,7 +19,21 @@ import discord
 import os
 import io
 import aiohttp
+from bisect import bisect_left
 from discord.ui import View, Button, Modal, TextInput, Select
+from locks import product_locks
+from reservations import (
+    ReserveError,
+    begin_delivery,
+    confirm,
+    release,
+    reserve,
+    stale_deliveries,
+    sweep_expired,
+)
+from outbox import PRIORITY_HIGH, PRIORITY_NORMAL, enqueue
+from rest_scheduler import LANE_CRITICAL, LANE_INTERACTION, LANE_PANEL, rest
+from timers import timer_wheel
 import time
 from dotenv import load_dotenv
 
@@ -31,15 +45,13 @@ CHANNEL_TESTIMONI = int(os.getenv("CHANNEL_TESTIMONI", "0"))
 
 # ===== Globals (diisi dari setup) =====
 bot = None
-c = None
-conn = None
+db = None
 fmt_wl = None
 PREFIX = "!"
 
 last_click = {}  # simpan user cooldown {user_id: timestamp}
 processing_locks = set() # simpan user yang sedang diproses {user_id}
 COOLDOWN_SECONDS = 10
-BUY_LOCK = asyncio.Lock()  # Global lock for purchasing
 
 # === TAMBAHAN DEPOSIT ===
 DEPOSIT_COOLDOWNS = {}
@@ -74,26 +86,21 @@ async def send_ephemeral_countdown(
     seconds: int = 30,
     embed: "discord.Embed | None" = None,
 ):
-    note = f"\n⏳ This message will expire in {seconds} seconds..."
+    # Countdown dirender client Discord (<t:..:R>); bot cuma sekali edit saat expired
+    expires_at = int(time.time()) + seconds
+    note = f"\n⏳ This message will expire <t:{expires_at}:R>..."
     await interaction.response.send_message(content + note, ephemeral=True, embed=embed)
+    timer_wheel.call_later(seconds, expire_ephemeral, interaction, embed)
+
+
+async def expire_ephemeral(interaction: discord.Interaction, embed: "discord.Embed | None" = None):
     try:
-        msg = await interaction.original_response()
-    except Exception:
-        return
-    for i in range(seconds - 1, 0, -1):
-        await asyncio.sleep(1)
-        try:
-            await msg.edit(
-                content=content + f"\n⏳ This message will expire in {i} seconds...",
-                embed=embed,
-            )
-        except Exception:
-            break
-    await asyncio.sleep(1)
-    try:
-        await msg.edit(
+        await rest.submit(
+            LANE_PANEL,
+            interaction.edit_original_response,
             content="✅ Expired (ephemeral disappears on reload / channel change).",
             embed=embed,
+            key=("expire", interaction.id),
         )
     except Exception:
         pass
@@ -120,7 +127,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                         description="Waiting for bot to come online...\nPlease wait up to 1 minute.",
                         color=discord.Color.orange()
                     )
-                    await msg.edit(content="", embed=embed_wait)
+                    await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed_wait)
                 except Exception:
                     pass
             
@@ -195,7 +202,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                                         description="Token expired/failed, generating new token...\n**Bot Busy Right Now, please wait.**",
                                         color=discord.Color.yellow()
                                     )
-                                    await msg.edit(content="", embed=embed_refresh)
+                                    await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed_refresh)
                                 except Exception:
                                     pass
                             
@@ -221,7 +228,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                                         description="New token generated! You can now click **Deposit WL** again.",
                                         color=discord.Color.green()
                                     )
-                                    await msg.edit(content="", embed=embed_ready)
+                                    await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed_ready)
                                 except Exception:
                                     pass
                             
@@ -255,7 +262,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                             description=f"Bot failed to come online.\n**Reason:** {add_msg}\n\nPlease try again later.",
                             color=discord.Color.red()
                         )
-                        await msg.edit(content="", embed=embed_fail)
+                        await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed_fail)
                     except Exception:
                         pass
                 
@@ -315,7 +322,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                 
                 if msg:
                     try:
-                        await msg.edit(content="", embed=embed)
+                        await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed)
                     except Exception:
                         pass
                 
@@ -353,7 +360,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                     embed_ok.add_field(name="💰 **Deposited**", value=f"`{dep_amount} WL`", inline=False)
                     embed_ok.add_field(name="🏦 **New Balance**", value=f"`{dep_balance} WL`", inline=False)
                     embed_ok.set_footer(text="Bot has been removed. Thank you!")
-                    await msg.edit(content="", embed=embed_ok)
+                    await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed_ok)
                 except Exception:
                     pass
             elif msg:
@@ -361,7 +368,7 @@ async def run_deposit_session(interaction: discord.Interaction):
                 try:
                     embed = discord.Embed(title="💳 **Deposit Expired**", color=discord.Color.red())
                     embed.description = "# Time's Up!\nPress the deposit button again if you want to deposit."
-                    await msg.edit(content="", embed=embed)
+                    await rest.submit(LANE_INTERACTION, msg.edit, content="", embed=embed)
                 except Exception:
                     pass
             
@@ -370,94 +377,120 @@ async def run_deposit_session(interaction: discord.Interaction):
 
 
 
-# ===== Schema helpers =====
-def ensure_users_schema(cur, connection):
-    # Users
-    cur.execute(
+async def fetch_products_for_select():
+    # Ambil daftar produk untuk dropdown
+    return await db.fetchall(
         """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            nama TEXT,
-            balance INTEGER DEFAULT 0
-        )
+        SELECT kode, judul, available_qty AS jumlah, harga
+        FROM stock
+        ORDER BY judul ASC
     """
     )
-    connection.commit()
 
-def ensure_preorders_schema(cur, connection):
-    # Preorders (GrowID terlebih dahulu -> nama, lalu user_id)
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS preorders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nama TEXT,
-            user_id INTEGER,
-            kode TEXT,
-            amount INTEGER,
-            status TEXT DEFAULT 'waiting', -- waiting | success | cancelled
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """
-    )
-    connection.commit()    
-    
-def ensure_transactions_schema(cur, connection):
-    # Catat transaksi BUY
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            kode TEXT,
-            jumlah INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    # Detail item dari transaksi BUY
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS transaction_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_id INTEGER,
-            nama_barang TEXT
-        )
-    """)
-    connection.commit()
 
+NO_PRODUCT_OPTIONS = [
+    discord.SelectOption(label="(No products)", value="none", description="Add stock first")
+]
 
-def ensure_transaction_items_schema(cur, connection):
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS transaction_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_id INTEGER,
-            nama_barang TEXT
-        )
-    """)
-    connection.commit()
-
-def ensure_preorder_items_schema(cur, connection):
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS preorder_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            preorder_id INTEGER,
-            nama_barang TEXT
-        )
-    """)
-    connection.commit()
 
+class ProductIndex:
+    """
+    Index prefix (in-memory) atas kode & judul produk untuk autocomplete.
+    Key: kode dan potongan judul mulai dari tiap kata ("dirt farm", "farm"),
+    lowercase, disimpan urut supaya lookup cukup bisect + scan sepanjang hasil.
+    """
 
-async def fetch_products_for_select():
-    # Ambil daftar produk untuk dropdown
-    cur = c  # alias
-    cur.execute(
-        """
-        SELECT s.kode, s.judul, COUNT(i.id) as jumlah, s.harga
-        FROM stock s
-        LEFT JOIN stock_items i ON s.kode = i.kode
-        GROUP BY s.kode, s.judul, s.harga
-        ORDER BY s.judul ASC
+    def __init__(self, products):
+        self._products = {code: (code, title, qty, price) for (code, title, qty, price) in products}
+        self._order = [code for (code, _, _, _) in products]  # urut judul
+        keys = set()
+        for code, title, _, _ in products:
+            keys.add((code.lower(), code))
+            words = (title or "").lower().split()
+            for i in range(len(words)):
+                keys.add((" ".join(words[i:]), code))
+        self._keys = sorted(keys)
+
+    def search(self, prefix: str, limit: int = 25):
+        """Return maks `limit` baris produk (kode, judul, qty, harga) yang cocok dengan prefix."""
+        prefix = (prefix or "").strip().lower()
+        if not prefix:
+            return [self._products[code] for code in self._order[:limit]]
+        found = []
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(found) < limit:
+            key, code = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            if code not in found:
+                found.append(code)
+            i += 1
+        return [self._products[code] for code in found]
+
+
+class ProductCatalog:
     """
-    )
-    return cur.fetchall()
+    Cache daftar produk: SelectOption dropdown BUY & BUY PO + ProductIndex
+    untuk autocomplete.
+
+    Dibangun sekali dari DB, lalu klik tombol cukup baca memori. Dibuang
+    (invalidate) oleh event restock / stock_changed (stok, harga, penjualan,
+    hapus produk). Klik bersamaan saat cache kosong menunggu satu query yang
+    sama.
+    """
+
+    def __init__(self):
+        self._data = None  # (buy_options, po_options, index)
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._version += 1
+        self._data = None
+
+    async def options(self):
+        """Return (buy_options, po_options); list lengkap, dipotong per halaman oleh picker."""
+        buy_options, po_options, _ = await self._load()
+        return buy_options, po_options
+
+    async def search(self, prefix: str, limit: int = 25):
+        _, _, index = await self._load()
+        return index.search(prefix, limit)
+
+    async def _load(self):
+        if self._data is not None:
+            return self._data
+        async with self._lock:
+            if self._data is not None:
+                return self._data
+            version = self._version
+            products = await fetch_products_for_select()
+            data = (
+                [
+                    discord.SelectOption(
+                        label=f"{title}",
+                        description=f"Stock: {qty} | Price: {price} WL",
+                        value=code,
+                    )
+                    for (code, title, qty, price) in products
+                ] or NO_PRODUCT_OPTIONS,
+                [
+                    discord.SelectOption(
+                        label=f"{title}",
+                        description=f"Pre Order Product | Price: {price} WL",
+                        value=code,
+                    )
+                    for (code, title, qty, price) in products
+                ] or NO_PRODUCT_OPTIONS,
+                ProductIndex(products),
+            )
+            # Ada invalidate selama query -> hasil ini mungkin basi, jangan disimpan
+            if version == self._version:
+                self._data = data
+            return data
+
+
+catalog = ProductCatalog()
 
 
 # ============================================================
@@ -496,8 +529,7 @@ class GrowIDModal(Modal, title="Set / Change GrowID"):
                 return
 
             # Cek tidak dipakai user lain
-            c.execute("SELECT user_id FROM users WHERE nama=?", (new_name,))
-            row = c.fetchone()
+            row = await db.fetchone("SELECT user_id FROM users WHERE nama=?", (new_name,))
             if row and row[0] != self.author_id:
                 await interaction.response.send_message(
                     "❌ GrowID sudah dipakai user lain.", ephemeral=True
@@ -505,22 +537,19 @@ class GrowIDModal(Modal, title="Set / Change GrowID"):
                 return
 
             # Update/insert
-            c.execute("SELECT nama FROM users WHERE user_id=?", (self.author_id,))
-            me = c.fetchone()
+            me = await db.fetchone("SELECT nama FROM users WHERE user_id=?", (self.author_id,))
             if me:
-                c.execute(
+                await db.execute(
                     "UPDATE users SET nama=? WHERE user_id=?", (new_name, self.author_id)
                 )
-                conn.commit()
                 await interaction.response.send_message(
                     f"✅ **GrowID updated:** `{new_name}`", ephemeral=True
                 )
             else:
-                c.execute(
+                await db.execute(
                     "INSERT INTO users (nama,balance,user_id) VALUES (?,0,?)",
                     (new_name, self.author_id),
                 )
-                conn.commit()
                 await interaction.response.send_message(
                     f"✅ **GrowID registered:** `{new_name}`", ephemeral=True
                 )
@@ -552,178 +581,162 @@ class BuyModal(Modal, title="Enter Amount"):
         processing_locks.add(self.author.id)
 
         try:
-            async with BUY_LOCK:
-                # Validasi amount
-                try:
-                    amount = int(str(self.qty_input.value).strip())
-                    if amount <= 0:
-                        raise ValueError
-                except Exception:
-                    await interaction.response.send_message(
-                        "❌ Invalid amount (harus angka > 0).", ephemeral=True
-                    )
-                    return
-
-                # Validasi user
-                uid = self.author.id
-                c.execute("SELECT balance FROM users WHERE user_id=?", (uid,))
-                u = c.fetchone()
-                if not u:
-                    await interaction.response.send_message(
-                        "❌ Register dulu (SET GROWID).", ephemeral=True
-                    )
-                    return
-                balance = int(u[0] or 0)
-
-                # Cek stock & harga
-                c.execute("SELECT COUNT(*) FROM stock_items WHERE kode=?", (self.kode,))
-                stok = int(c.fetchone()[0] or 0)
-                if stok < amount:
-                    await interaction.response.send_message(
-                        f"❌ Stock tidak cukup. Tersisa: {stok}", ephemeral=True
-                    )
-                    return
-
-                c.execute("SELECT harga FROM stock WHERE kode=?", (self.kode,))
-                h = c.fetchone()
-                if not h:
-                    await interaction.response.send_message(
-                        "❌ Invalid product code.", ephemeral=True
-                    )
-                    return
-                price = int(h[0])
-                total = price * amount
-                if balance < total:
-                    await interaction.response.send_message(
-                        "❌ Balance kurang.", ephemeral=True
-                    )
-                    return
-
-                # Ambil items
-                c.execute(
-                    "SELECT id, nama_barang FROM stock_items WHERE kode=? ORDER BY id LIMIT ?",
-                    (self.kode, amount),
+            # Validasi amount
+            try:
+                amount = int(str(self.qty_input.value).strip())
+                if amount <= 0:
+                    raise ValueError
+            except Exception:
+                await interaction.response.send_message(
+                    "❌ Invalid amount (harus angka > 0).", ephemeral=True
                 )
-                items = c.fetchall()
-
-                ids = [str(x[0]) for x in items]
-                if not ids:
-                    await interaction.response.send_message(
-                        "❌ Stock berubah, coba lagi.", ephemeral=True
-                    )
-                    return
-                bought_names = "\n".join([x[1] for x in items])
+                return
 
+            uid = self.author.id
+            error = None
 
+            # 3. Reservasi di bawah lock produk: klaim item + potong saldo (milidetik).
+            #    DM, role & testimoni jalan di luar lock, paralel dengan pembeli lain.
+            async with product_locks(self.kode):
+                # Validasi user
+                u = await db.fetchone("SELECT balance, poin FROM users WHERE user_id=?", (uid,))
+                if not u:
+                    error = "❌ Register dulu (SET GROWID)."
+                else:
+                    try:
+                        reservation_id, price, items = await db.run(reserve, uid, self.kode, amount)
+                    except ReserveError as e:
+                        error = str(e)
 
-                c.execute("SELECT poin FROM users WHERE user_id = ?", (uid,))
-                row = c.fetchone()
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+            bot.dispatch("stock_changed", self.kode)
 
-                poin_sekarang = int((row[0] if row else 0) or 0)
-                poin_after = poin_sekarang + amount
-                wl_dari_poin = amount
+            balance = int(u[0] or 0)
+            poin_sekarang = int(u[1] or 0)
+            total = price * amount
+            bought_names = "\n".join([x[1] for x in items])
 
-                new_balance = (balance - total)
-                await interaction.response.defer(ephemeral=True)
+            poin_after = poin_sekarang + amount
+            wl_dari_poin = amount
 
-                # DM wajib sukses
-                try:
-                    # Buat file txt untuk items
-                    items_content = bought_names
-                    items_file = io.BytesIO(items_content.encode('utf-8'))
-                    items_file.name = f"{self.kode}_{amount}items.txt"
-                    
-                    msg = (
-                        "**🛒 Purchase Success!**\n"
-                        "━━━━━━━━━━━━━━━━━━━━\n"
-                        f"**Code   :** `{self.kode}`\n"
-                        f"**Amount :** `{amount}`\n"
-                        f"**Price  :** `{price} WL`\n"
-                        f"**Total  :** `{total} WL`\n"
-                        f"**Balance:** `{new_balance} WL`"
-                    )
-                    await self.author.send(msg, file=discord.File(items_file, filename=f"{self.kode}_{amount}items.txt"))
-                    await self.author.send(
-                        f"**🔄 Konversi Poin Selesai!**\n"
-                        f"➕ **+{wl_dari_poin} WL** dari poin\n"
-                        f"💰 **WL Kamu Sekarang:** `{new_balance + wl_dari_poin} WL`\n"
-                        f"🪙 **Total Poin:** `{poin_after}`"
-                    )
-                except Exception:
-                    await interaction.followup.send(
-                        "❌ DM kamu mati. Pembelian dibatalkan.", ephemeral=True
-                    )
-                    return
+            new_balance = (balance - total)
+            await interaction.response.defer(ephemeral=True)
 
-                # Commit transaksi
-                c.execute(
-                    f"DELETE FROM stock_items WHERE id IN ({','.join(['?'] * len(ids))})",
-                    ids
+            # Kunci reservasi dari sweeper sebelum DM; kalau keburu expired, jangan kirim item
+            if not await db.run(begin_delivery, reservation_id):
+                await interaction.followup.send(
+                    "❌ Waktu pembelian habis, saldo sudah dikembalikan. Silakan beli lagi.", ephemeral=True
                 )
-                c.execute("UPDATE users SET balance = ?, poin = ? WHERE user_id = ?",
-                      (new_balance + wl_dari_poin, poin_after, uid,))
+                return
+
+            # DM item wajib sukses (gagal -> pembelian batal), jadi tetap dikirim langsung.
+            # DM konversi poin & testimoni lewat outbox setelah confirm.
+            try:
+                # Buat file txt untuk items
+                items_content = bought_names
+                items_file = io.BytesIO(items_content.encode('utf-8'))
+                items_file.name = f"{self.kode}_{amount}items.txt"
                 
-                c.execute(
-                    "INSERT INTO transactions (user_id, kode, jumlah) VALUES (?, ?, ?)",
-                    (uid, self.kode, amount)
+                msg = (
+                    "**🛒 Purchase Success!**\n"
+                    "━━━━━━━━━━━━━━━━━━━━\n"
+                    f"**Code   :** `{self.kode}`\n"
+                    f"**Amount :** `{amount}`\n"
+                    f"**Price  :** `{price} WL`\n"
+                    f"**Total  :** `{total} WL`\n"
+                    f"**Balance:** `{new_balance} WL`"
+                )
+                await rest.submit(
+                    LANE_CRITICAL,
+                    self.author.send,
+                    msg,
+                    file=discord.File(items_file, filename=f"{self.kode}_{amount}items.txt"),
+                )
+            except Exception:
+                # DM gagal -> item balik ke stock & saldo dikembalikan
+                await db.run(release, reservation_id)
+                bot.dispatch("restock", self.kode)
+                await interaction.followup.send(
+                    "❌ DM kamu mati. Pembelian dibatalkan.", ephemeral=True
                 )
-                transaction_id = c.lastrowid  # ambil order number
+                return
 
-                # Simpan detail item yang dibeli
-                for _, nama_barang in items:
-                    c.execute(
-                        "INSERT INTO transaction_items (transaction_id, nama_barang) VALUES (?, ?)",
-                        (transaction_id, nama_barang)
-                    )
+            poin_msg = (
+                f"**🔄 Konversi Poin Selesai!**\n"
+                f"➕ **+{wl_dari_poin} WL** dari poin\n"
+                f"💰 **WL Kamu Sekarang:** `{new_balance + wl_dari_poin} WL`\n"
+                f"🪙 **Total Poin:** `{poin_after}`"
+            )
 
-                conn.commit()
+            def testimoni_embed(transaction_id):
+                embed = discord.Embed(
+                    title=f"#Order Number: {transaction_id}",
+                    color=discord.Color.gold()
+                )
+                embed.add_field(name="<a:megaphone:1419515391851626580> Pembeli", value=self.author.mention, inline=False)
+                embed.add_field(name="Produk <a:menkrep:1122531571098980394>", value=f"{amount} {self.kode}", inline=False)
+                embed.add_field(name="Total Price", value=f"{fmt_wl(total)} <a:world_lock:1419515667773657109>", inline=False)
+                embed.set_footer(text="Thanks For Purchasing Our Product(s)")
+                return embed
+
+            # DM sukses -> catat transaksi + konversi poin; DM poin & testimoni commit bareng
+            def finish(c):
+                transaction_id = confirm(c, reservation_id, wl_dari_poin, amount)
+                if transaction_id is None:
+                    return None
+                enqueue(c, "dm", uid, poin_msg, priority=PRIORITY_HIGH)
+                if CHANNEL_TESTIMONI:
+                    enqueue(c, "channel", CHANNEL_TESTIMONI, embed=testimoni_embed(transaction_id),
+                            priority=PRIORITY_NORMAL)
+                return transaction_id
+
+            transaction_id = await db.run(finish)
+            bot.outbox.wake()
+            bot.dispatch("stock_changed", self.kode)  # Product Sold bertambah
+            if transaction_id is None:
+                # Tidak boleh terjadi (reservasi 'delivering' tidak di-sweep): item sudah
+                # terkirim tapi transaksi tidak tercatat -> eskalasi ke admin
+                print(
+                    f"[ERROR] Reservasi {reservation_id} hilang sebelum confirm (user {uid}, "
+                    f"{amount} {self.kode}); item sudah di-DM, cek manual!"
+                )
+                await interaction.followup.send(
+                    "⚠️ Item sudah dikirim ke DM, tapi transaksi gagal dicatat. Hubungi admin.",
+                    ephemeral=True,
+                )
+                return
 
-                # ✅ Tambahkan role BUY ke pembeli
-                try:
-                    guild = interaction.guild
-                    if guild is None:
-                        print("[WARN] Guild is None (interaction from DM?)")
-                    else:
-                        role = guild.get_role(ROLE_BUY)  # Role "Buy"
-                        if role:
-                            await self.author.add_roles(role)
-                            print(f"[DEBUG] Role 'Buy' diberikan ke {self.author}.")
-                        else:
-                            print("[WARN] Role 'Buy' tidak ditemukan di server.")
-                except Exception as e:
-                    print(f"[ERROR] Gagal memberi role 'Buy': {e}")
-
-                # ✅ Kirim testimoni ke channel seller
-                channel = bot.get_channel(CHANNEL_TESTIMONI)
-                if channel:
-                    embed = discord.Embed(
-                        title=f"#Order Number: {transaction_id}",
-                        color=discord.Color.gold()
-                    )
-                    embed.add_field(name="<a:megaphone:1419515391851626580> Pembeli", value=self.author.mention, inline=False)
-                    embed.add_field(name="Produk <a:menkrep:1122531571098980394>", value=f"{amount} {self.kode}", inline=False)
-                    embed.add_field(name="Total Price", value=f"{fmt_wl(total)} <a:world_lock:1419515667773657109>", inline=False)
-                    embed.set_footer(text="Thanks For Purchasing Our Product(s)")
-                    await channel.send(embed=embed)
-                    sent_channel_id = channel.id
+            # ✅ Tambahkan role BUY ke pembeli
+            try:
+                guild = interaction.guild
+                if guild is None:
+                    print("[WARN] Guild is None (interaction from DM?)")
                 else:
-                    sent_channel_id = None
+                    role = guild.get_role(ROLE_BUY)  # Role "Buy"
+                    if role:
+                        await self.author.add_roles(role)
+                        print(f"[DEBUG] Role 'Buy' diberikan ke {self.author}.")
+                    else:
+                        print("[WARN] Role 'Buy' tidak ditemukan di server.")
+            except Exception as e:
+                print(f"[ERROR] Gagal memberi role 'Buy': {e}")
 
-                # Confirm to buyer in interaction
-                try:
-                    await interaction.followup.send(
-                        f"Purchase success. Check your DM for items. Order: {transaction_id}.",
-                        ephemeral=True,
-                    )
-                except Exception as e:
-                    print(f"[WARN] Gagal kirim konfirmasi interaction: {e}")
+            # Confirm to buyer in interaction
+            try:
+                await interaction.followup.send(
+                    f"Purchase success. Check your DM for items. Order: {transaction_id}.",
+                    ephemeral=True,
+                )
+            except Exception as e:
+                print(f"[WARN] Gagal kirim konfirmasi interaction: {e}")
 
-                # Debug log
-                print(f"[DEBUG] Transaksi {transaction_id} oleh {self.author} berhasil. Testimoni dikirim ke {sent_channel_id}.")
+            # Debug log
+            print(f"[DEBUG] Transaksi {transaction_id} oleh {self.author} berhasil. Testimoni diantrikan ke {CHANNEL_TESTIMONI or None}.")
         finally:
             processing_locks.discard(self.author.id)
 
-
 # ============================================================
 # BUY PO (Pre Order)
 # ============================================================
@@ -756,119 +769,136 @@ class BuyPOModal(Modal, title="Enter PO Amount (Max 10)"):
         processing_locks.add(self.author.id)
 
         try:
-            async with BUY_LOCK:
-                uid = self.author.id
-                # Harus terdaftar
-                c.execute("SELECT nama FROM users WHERE user_id=?", (uid,))
-                row = c.fetchone()
-                if not row:
-                    await interaction.response.send_message(
-                        "❌ Kamu belum register. Klik **SET GROWID**.", ephemeral=True
-                    )
-                    return
-                growid = row[0]
+            uid = self.author.id
+            # Harus terdaftar
+            row = await db.fetchone("SELECT nama FROM users WHERE user_id=?", (uid,))
+            if not row:
+                await interaction.response.send_message(
+                    "❌ Kamu belum register. Klik **SET GROWID**.", ephemeral=True
+                )
+                return
+            growid = row[0]
 
-                # Amount 1..10
-                try:
-                    amt = int(str(self.qty_input.value).strip())
-                    if amt <= 0 or amt > 10:
-                        raise ValueError
-                except Exception:
-                    await interaction.response.send_message(
-                        "❌ Amount harus 1–10.", ephemeral=True
-                    )
-                    return
+            # Amount 1..10
+            try:
+                amt = int(str(self.qty_input.value).strip())
+                if amt <= 0 or amt > 10:
+                    raise ValueError
+            except Exception:
+                await interaction.response.send_message(
+                    "❌ Amount harus 1–10.", ephemeral=True
+                )
+                return
+
+            error = None
 
+            # 3. Lock produk: cek kuota + potong saldo + catat PO (commit)
+            async with product_locks(self.kode):
                 # Cek total waiting existing user utk kode ini
-                c.execute(
+                waiting_total = int(await db.fetchval(
                     """
                     SELECT COALESCE(SUM(amount),0)
                     FROM preorders
                     WHERE user_id=? AND kode=? AND status='waiting'
                 """,
                     (uid, self.kode),
-                )
-                waiting_total = int(c.fetchone()[0] or 0)
-                if waiting_total >= 10 or waiting_total + amt > 10:
-                    await interaction.response.send_message(
-                        "❌ Max PO 10 per produk (kamu sudah penuh).", ephemeral=True
-                    )
-                    return
-
-                        # Ambil harga produk
-                c.execute("SELECT harga FROM stock WHERE kode=?", (self.kode,))
-                h = c.fetchone()
-                if not h:
-                    await interaction.response.send_message("❌ Produk tidak valid.", ephemeral=True)
-                    return
-                price = int(h[0])
-                total = price * amt
-
-                # Ambil saldo user
-                c.execute("SELECT balance FROM users WHERE user_id=?", (uid,))
-                row_balance = c.fetchone()
+                    0,
+                ))
+                # Ambil harga produk & saldo user
+                h = await db.fetchone("SELECT harga FROM stock WHERE kode=?", (self.kode,))
+                row_balance = await db.fetchone("SELECT balance FROM users WHERE user_id=?", (uid,))
                 balance = int(row_balance[0] or 0)
 
-                # Cek saldo cukup atau tidak
-                if balance < total:
-                    await interaction.response.send_message(
-                        f"❌ Saldo tidak cukup. Kamu butuh {fmt_wl(total)} WL, saldo kamu {fmt_wl(balance)} WL.",
-                        ephemeral=True
-                    )
-                    return
-
-                # Potong saldo user
-                new_balance = balance - total
-                c.execute("UPDATE users SET balance=? WHERE user_id=?", (new_balance, uid))
+                if waiting_total >= 10 or waiting_total + amt > 10:
+                    error = "❌ Max PO 10 per produk (kamu sudah penuh)."
+                elif not h:
+                    error = "❌ Produk tidak valid."
+                elif balance < int(h[0]) * amt:
+                    # Cek saldo cukup atau tidak
+                    total = int(h[0]) * amt
+                    error = f"❌ Saldo tidak cukup. Kamu butuh {fmt_wl(total)} WL, saldo kamu {fmt_wl(balance)} WL."
+                else:
+                    price = int(h[0])
+                    total = price * amt
+
+                    def place_po(c):
+                        # Potong saldo user
+                        c.execute(
+                            "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+                            (total, uid, total),
+                        )
+                        if c.rowcount == 0:
+                            return None
+
+                        # Insert PO waiting
+                        c.execute(
+                            """
+                            INSERT INTO preorders (nama, user_id, kode, amount, status)
+                            VALUES (?, ?, ?, ?, 'waiting')
+                            """,
+                            (growid, uid, self.kode, amt),
+                        )
+                        return c.lastrowid
 
-                # Insert PO waiting
-                c.execute(
-                    """
-                    INSERT INTO preorders (nama, user_id, kode, amount, status)
-                    VALUES (?, ?, ?, ?, 'waiting')
-                    """,
-                    (growid, uid, self.kode, amt),
-                )
-                po_id = c.lastrowid
-                conn.commit()
+                    po_id = await db.run(place_po)
+                    if po_id is None:
+                        error = "❌ Saldo berubah, coba lagi."
 
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
 
-                # Hitung nomor antrian
-                c.execute(
-                    """
-                    SELECT COUNT(*) FROM preorders
-                    WHERE kode=? AND status='waiting'
-                    AND created_at <= (SELECT created_at FROM preorders WHERE id=?)
-                """,
-                    (self.kode, po_id),
+            # Hitung nomor antrian
+            queue_pos = int(await db.fetchval(
+                """
+                SELECT COUNT(*) FROM preorders
+                WHERE kode=? AND status='waiting'
+                AND created_at <= (SELECT created_at FROM preorders WHERE id=?)
+            """,
+                (self.kode, po_id),
+                1,
+            ))
+
+            # DM konfirmasi PO (wajib sukses)
+            try:
+                msg = (
+                    "**📦 Pre Order Dicatat**\n"
+                    "━━━━━━━━━━━━━━━━━━━━\n"
+                    f"**Produk  :** `{self.kode}`\n"
+                    f"**Jumlah  :** `{amt}`\n"
+                    f"**Status  :** 🟡 Menunggu stok\n"
+                    f"**Antrian :** `#{queue_pos}`"
                 )
-                queue_pos = int(c.fetchone()[0] or 1)
-
-                # DM konfirmasi PO (wajib sukses)
-                try:
-                    msg = (
-                        "**📦 Pre Order Dicatat**\n"
-                        "━━━━━━━━━━━━━━━━━━━━\n"
-                        f"**Produk  :** `{self.kode}`\n"
-                        f"**Jumlah  :** `{amt}`\n"
-                        f"**Status  :** 🟡 Menunggu stok\n"
-                        f"**Antrian :** `#{queue_pos}`"
-                    )
-                    await self.author.send(msg)
-                    await interaction.response.send_message(
-                        "✅ **PO dicatat!** Cek DM untuk detail.", ephemeral=True
-                    )
-                except Exception:
-                    # DM mati -> batalkan PO
+                await rest.submit(LANE_CRITICAL, self.author.send, msg)
+            except Exception:
+                # DM mati -> batalkan PO & kembalikan saldo. Refund = sisa amount
+                # (safety sweep alokasi bisa saja sudah mengisi sebagian).
+                def cancel_po(c):
+                    row = c.execute(
+                        "SELECT amount FROM preorders WHERE id=? AND status='waiting'", (po_id,)
+                    ).fetchone()
+                    if not row:
+                        return
                     c.execute("UPDATE preorders SET status='cancelled' WHERE id=?", (po_id,))
-                    conn.commit()
-                    await interaction.response.send_message(
-                        "❌ DM kamu mati, PO dibatalkan.", ephemeral=True
+                    c.execute(
+                        "UPDATE users SET balance = balance + ? WHERE user_id=?", (int(row[0]) * price, uid)
                     )
+
+                await db.run(cancel_po)
+                await interaction.response.send_message(
+                    "❌ DM kamu mati, PO dibatalkan.", ephemeral=True
+                )
+                return
+
+            # Alokasi baru jalan setelah user dapat DM konfirmasi (DM item tidak
+            # mendahului konfirmasi, dan jalur cancel tidak balapan dengan fill)
+            bot.dispatch("preorder_placed", self.kode)
+            await interaction.response.send_message(
+                "✅ **PO dicatat!** Cek DM untuk detail.", ephemeral=True
+            )
         finally:
             processing_locks.discard(self.author.id)
 
-
 # ============================================================
 # DEPO QRIS Modal (Deposit via Pakasir QRIS)
 # ============================================================
@@ -933,27 +963,12 @@ class DepoQRISModal(Modal, title="Deposit QRIS"):
 # Product Selectors
 # ============================================================
 class ProductSelect(Select):
-    """Dropdown untuk BUY (tampilkan stok & harga)."""
+    """Dropdown untuk BUY (tampilkan stok & harga). Options dari catalog.options()."""
 
-    def __init__(self, author: discord.Member, products=None):
-        if not products:
-            options = [
-                discord.SelectOption(
-                    label="(No products)", value="none", description="Add stock first"
-                )
-            ]
-        else:
-            options = [
-                discord.SelectOption(
-                    label=f"{title}",
-                    description=f"Stock: {qty} | Price: {price} WL",
-                    value=code,
-                )
-                for (code, title, qty, price) in products
-            ]
+    def __init__(self, author: discord.Member, options):
         super().__init__(
             placeholder="Choose a product...",
-            options=options,
+            options=list(options),
             min_values=1,
             max_values=1,
         )
@@ -968,34 +983,13 @@ class ProductSelect(Select):
         )
 
 
-class ProductSelectView(View):
-    def __init__(self, author: discord.Member, products=None):
-        super().__init__(timeout=90)
-        self.add_item(ProductSelect(author, products=products))
-
-
 class ProductSelectPO(Select):
     """Dropdown untuk BUY PO (tanpa stok, teks 'Pre Order Product | Price: ...')."""
 
-    def __init__(self, author: discord.Member, products=None):
-        if not products:
-            options = [
-                discord.SelectOption(
-                    label="(No products)", value="none", description="Add stock first"
-                )
-            ]
-        else:
-            options = [
-                discord.SelectOption(
-                    label=f"{title}",
-                    description=f"Pre Order Product | Price: {price} WL",
-                    value=code,
-                )
-                for (code, title, qty, price) in products
-            ]
+    def __init__(self, author: discord.Member, options):
         super().__init__(
             placeholder="Choose a product (PO)...",
-            options=options,
+            options=list(options),
             min_values=1,
             max_values=1,
         )
@@ -1010,21 +1004,79 @@ class ProductSelectPO(Select):
         )
 
 
-class ProductSelectPOView(View):
-    def __init__(self, author: discord.Member, products=None):
+SELECT_PAGE_SIZE = 25  # batas option per Select dari Discord
+
+
+class ProductPickerView(View):
+    """
+    Dropdown produk berhalaman: satu Select (maks 25 option) + tombol
+    Prev / Next. Subclass menentukan class Select-nya.
+    """
+
+    select_cls = None
+
+    def __init__(self, author: discord.Member, options):
         super().__init__(timeout=90)
-        self.add_item(ProductSelectPO(author, products=products))
+        self.author = author
+        self.options = options
+        self.page = 0
+        self.page_count = max(1, -(-len(options) // SELECT_PAGE_SIZE))
+        self._render()
+
+    def _render(self):
+        self.clear_items()
+        start = self.page * SELECT_PAGE_SIZE
+        self.add_item(self.select_cls(self.author, self.options[start:start + SELECT_PAGE_SIZE]))
+        if self.page_count == 1:
+            return
+        prev_button = Button(label="◀ Prev", style=discord.ButtonStyle.gray, row=1, disabled=self.page == 0)
+        prev_button.callback = self._prev
+        page_button = Button(
+            label=f"Page {self.page + 1}/{self.page_count}", style=discord.ButtonStyle.gray, row=1, disabled=True
+        )
+        next_button = Button(
+            label="Next ▶", style=discord.ButtonStyle.gray, row=1, disabled=self.page >= self.page_count - 1
+        )
+        next_button.callback = self._next
+        self.add_item(prev_button)
+        self.add_item(page_button)
+        self.add_item(next_button)
+
+    async def _turn(self, interaction: discord.Interaction, step: int):
+        self.page = min(max(self.page + step, 0), self.page_count - 1)
+        self._render()
+        await interaction.response.edit_message(view=self)
+
+    async def _prev(self, interaction: discord.Interaction):
+        await self._turn(interaction, -1)
+
+    async def _next(self, interaction: discord.Interaction):
+        await self._turn(interaction, 1)
+
+
+class ProductSelectView(ProductPickerView):
+    select_cls = ProductSelect
+
+
+class ProductSelectPOView(ProductPickerView):
+    select_cls = ProductSelectPO
 
 
 # ============================================================
 # Stock View (dengan tombol BUY PO dan DEPO QRIS)
 # ============================================================
 class StockView(View):
-    def __init__(self):
-        super().__init__(timeout=300)
+    """
+    Tombol panel stock. Persisten (timeout=None, custom_id tetap); klik
+    ditangani on_interaction di setup(), bukan callback view.
+    Jangan buat langsung, pakai stock_view(is_mt).
+    """
+
+    def __init__(self, is_mt: bool = False):
+        super().__init__(timeout=None)
         self.add_item(
             Button(label="Buy", style=discord.ButtonStyle.green, custom_id="buy",
-                disabled=self.is_mt())
+                disabled=is_mt)
         )
         self.add_item(
             Button(label="Buy PO", style=discord.ButtonStyle.green, custom_id="buy_po",
@@ -1033,19 +1085,19 @@ class StockView(View):
         self.add_item(
             Button(
                 label="Deposit WL", style=discord.ButtonStyle.blurple, custom_id="deposit",
-                disabled=self.is_mt()
+                disabled=is_mt
             )
         )
         self.add_item(
             Button(
                 label="Depo QRIS", style=discord.ButtonStyle.blurple, custom_id="depo_qris",
-                disabled=self.is_mt()
+                disabled=is_mt
             )
         )
         self.add_item(
             Button(
                 label="Set GrowID", style=discord.ButtonStyle.gray, custom_id="growid",
-                disabled=self.is_mt()
+                disabled=is_mt
             )
         )
         self.add_item(
@@ -1053,21 +1105,20 @@ class StockView(View):
                 label="My Balance",
                 style=discord.ButtonStyle.secondary,
                 custom_id="balance",
-                disabled=self.is_mt()
+                disabled=is_mt
             )
         )
 
 
+_stock_views = {}  # is_mt -> StockView
 
-    def is_mt(self):
-        c.execute("SELECT is_mt FROM maintenance LIMIT 1")
-        row = c.fetchone()
-        is_mt = row[0] if row else 0
-
-        if is_mt == 1:
-            return True
-        return False
 
+def stock_view(is_mt: bool) -> StockView:
+    """StockView dibuat sekali per state maintenance, lalu dipakai ulang."""
+    view = _stock_views.get(is_mt)
+    if view is None:
+        view = _stock_views[is_mt] = StockView(is_mt)
+    return view
 
 
 # ============================================================
@@ -1076,31 +1127,62 @@ class StockView(View):
 from discord.ext import tasks
 
 
+@tasks.loop(seconds=30)
+async def sweep_reservations():
+    """Kembalikan reservasi pembelian yang expired (mis. bot restart saat kirim DM)."""
+    try:
+        codes = await db.run(sweep_expired)
+        if codes:
+            print(f"[RESERVE] {len(codes)} reservasi expired dikembalikan ke stock")
+        for kode in set(codes):
+            bot.dispatch("restock", kode)
+    except Exception as e:
+        print(f"[RESERVE] Sweep gagal: {e}")
+
+
 # ============================================================
 # Setup hook
 # ============================================================
 _listener_added = False  # Flag untuk mencegah duplikat listener
 
-def setup(_bot, _c, _conn, _fmt_wl, _PREFIX):
-    global bot, c, conn, fmt_wl, PREFIX, _listener_added
+def setup(_bot, _db, _fmt_wl, _PREFIX):
+    global bot, db, fmt_wl, PREFIX, _listener_added
     bot = _bot
-    c = _c
-    conn = _conn
+    db = _db
     fmt_wl = _fmt_wl
     PREFIX = _PREFIX
 
-    # pastikan schema
-    ensure_users_schema(c, conn)
-    ensure_preorders_schema(c, conn)
-    ensure_transactions_schema(c, conn)
-    ensure_transaction_items_schema(c, conn)
-    ensure_preorder_items_schema(c, conn)
-    
     # Hanya daftarkan listener sekali
     if _listener_added:
         return
     _listener_added = True
-    
+
+    @bot.listen('on_ready')
+    async def start_reservation_sweeper():
+        if not sweep_reservations.is_running():
+            sweep_reservations.start()
+            for reservation_id, user_id, kode, amount in await db.run(stale_deliveries):
+                print(
+                    f"[RESERVE] ⚠️ Reservasi {reservation_id} (user {user_id}, {amount} {kode}) "
+                    "tertinggal 'delivering' (bot mati saat DM item), cek manual"
+                )
+
+    # Cache dropdown produk dibuang tiap ada perubahan stok/harga/produk
+    @bot.listen('on_restock')
+    async def catalog_on_restock(kode):
+        catalog.invalidate()
+
+    @bot.listen('on_stock_changed')
+    async def catalog_on_stock_changed(kode):
+        catalog.invalidate()
+
+    @bot.listen('on_ready')
+    async def register_stock_view():
+        # Sekali per proses: tombol panel lama tetap hidup setelah restart.
+        # (View butuh event loop jalan, jadi tidak bisa di setup().)
+        if not bot.persistent_views:
+            bot.add_view(stock_view(False))
+
     # handler tombol
     async def on_interaction(interaction: discord.Interaction):
         # HANYA PROSES TOMBOL / SELECT DI SINI
@@ -1152,20 +1234,20 @@ def setup(_bot, _c, _conn, _fmt_wl, _PREFIX):
         try:
             # BUY (lama)
             if cid == "buy":
-                products = await fetch_products_for_select()
+                buy_options, _ = await catalog.options()
                 await interaction.response.send_message(
                     "**🛒 Pilih Produk:**",
-                    view=ProductSelectView(user, products=products),
+                    view=ProductSelectView(user, buy_options),
                     ephemeral=True,
                 )
                 return
 
             # BUY PO (baru)
             if cid == "buy_po":
-                products = await fetch_products_for_select()
+                _, po_options = await catalog.options()
                 await interaction.response.send_message(
                     "**🛒 Pilih Produk PO (Max 10 per user):**",
-                    view=ProductSelectPOView(user, products=products),
+                    view=ProductSelectPOView(user, po_options),
                     ephemeral=True,
                 )
                 return
@@ -1177,8 +1259,7 @@ def setup(_bot, _c, _conn, _fmt_wl, _PREFIX):
 
             # Balance
             if cid == "balance":
-                c.execute("SELECT nama, balance FROM users WHERE user_id=?", (user.id,))
-                r = c.fetchone()
+                r = await db.fetchone("SELECT nama, balance FROM users WHERE user_id=?", (user.id,))
                 if r:
                     await send_ephemeral_countdown(
                         interaction,
@@ -1238,15 +1319,15 @@ def setup(_bot, _c, _conn, _fmt_wl, _PREFIX):
 
 # ============================================================
 # Catatan:
-# - Panggil allocate_preorders(kode) SETIAP kali kamu menambah stok
+# - Panggil bot.dispatch("restock", kode) SETIAP kali kamu menambah stok
 #   (misal di command admin restock), agar PO waiting langsung didistribusi.
+#   Scheduler di bot_core menggabungkan event per kode; loop 5 menit hanya
+#   safety sweep.
 # - Kalau kamu butuh command admin contoh:
 #
 #   @bot.command()
 #   @commands.has_permissions(administrator=True)
 #   async def restockpo(ctx, kode: str):
-#       await allocate_preorders(kode)
-#       await ctx.reply(f"PO untuk {kode} sudah dialokasikan (kalau ada).")
-#
-#   (Taruh di modul command-mu, pastikan import allocate_preorders)
+#       bot.dispatch("restock", kode)
+#       await ctx.reply(f"Alokasi PO untuk {kode} dijadwalkan (kalau ada).")
 # ============================================================
@@ -0,0 +1,60 @@
+"""
+Resolver objek user Discord (pengganti `bot.fetch_user` berulang).
+
+`fetch_user` selalu REST call (tidak pakai cache). Resolver ini:
+1. cek cache gateway (`bot.get_user`) — gratis;
+2. cek cache LRU + TTL sendiri (ukuran dibatasi);
+3. baru fetch ke API kalau miss. Lookup paralel untuk id yang sama
+   (mis. satu user punya beberapa PO di satu restock) digabung jadi satu
+   request.
+
+    user = await bot.user_resolver.get(user_id)
+
+Error dari fetch_user (NotFound, HTTPException) diteruskan ke caller dan
+tidak di-cache.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL = 10 * 60  # detik
+
+
+class UserResolver:
+    def __init__(self, bot, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.bot = bot
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = OrderedDict()  # user_id -> (user, expires_at), urut LRU
+        self._inflight = {}  # user_id -> Future fetch yang sedang jalan
+
+    async def get(self, user_id: int):
+        user_id = int(user_id)
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user
+
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(user_id)
+                return user
+            del self._cache[user_id]
+
+        fut = self._inflight.get(user_id)
+        if fut is None:
+            fut = self._inflight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+            fut.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        # shield: caller yang di-cancel tidak membatalkan fetch milik caller lain
+        return await asyncio.shield(fut)
+
+    async def _fetch(self, user_id: int):
+        user = await self.bot.fetch_user(user_id)
+        self._cache[user_id] = (user, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return user